@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of the per-request overhead of spec components.
+
+Generated routes instantiate a component on every request. Compares running the spec's
+``dj_query`` and ``restriction`` code blocks with ``exec`` as ``FetchComponent.__init__``
+used to against binding the functions compiled once by ``compile_spec_function``, and
+times a whole ``FetchComponent`` instantiation. Virtual modules are replaced by a stand-in
+so that no database is required.
+
+Usage:
+    python benchmarks/component_init.py [--number 1000] [--repeat 5]
+"""
+
+import argparse
+import inspect
+import timeit
+import types
+from unittest import mock
+from pharus import component_interface
+from pharus.component_interface import FetchComponent, compile_spec_function
+
+COMPONENT_CONFIG = dict(
+    type="antd-table",
+    route="/query1",
+    restriction="""
+def restriction(**kwargs):
+    return dict(**kwargs)
+""",
+    dj_query="""
+def dj_query(test_group1_simple):
+    TableA, TableB = (test_group1_simple.TableA, test_group1_simple.TableB)
+    q = TableA * TableB
+    f = []
+    return dict(query=q, fetch_args=f)
+""",
+)
+
+
+def legacy_bind(component_config: dict) -> tuple:
+    # Code blocks of the spec as `FetchComponent.__init__` used to run them
+    lcls = locals()
+    exec(component_config["dj_query"], vars(component_interface), lcls)
+    dj_query = lcls["dj_query"]
+    exec(component_config["restriction"], vars(component_interface), lcls)
+    return dj_query, lcls["restriction"], inspect.getfullargspec(dj_query).args
+
+
+def compiled_bind(component_config: dict) -> tuple:
+    dj_query, dj_query_args = compile_spec_function(
+        component_config["dj_query"], "dj_query"
+    )
+    restriction = compile_spec_function(component_config["restriction"], "restriction")[
+        0
+    ]
+    return dj_query, restriction, dj_query_args
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    def per_request(function):
+        return (
+            min(timeit.repeat(function, number=args.number, repeat=args.repeat))
+            / args.number
+        )
+
+    legacy = per_request(lambda: legacy_bind(COMPONENT_CONFIG))
+    compiled = per_request(lambda: compiled_bind(COMPONENT_CONFIG))
+    with mock.patch.object(
+        component_interface._DJConnector,
+        "_get_virtual_module",
+        lambda connection, schema_name, module_name=None: types.SimpleNamespace(),
+    ):
+        instantiation = per_request(
+            lambda: FetchComponent(
+                name="query1",
+                component_config=COMPONENT_CONFIG,
+                static_config=None,
+                connection=None,
+            )
+        )
+    print(f"exec of spec code per request:        {legacy * 1e6:8.2f} us")
+    print(f"binding of compiled spec code:        {compiled * 1e6:8.2f} us")
+    print(f"speedup:                              {legacy / compiled:8.2f}x")
+    print(f"FetchComponent instantiation:         {instantiation * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
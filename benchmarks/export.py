@@ -0,0 +1,98 @@
+"""
+Benchmark of ``_DJConnector._export`` with a single cursor against concurrently fetched
+primary key ranges.
+
+Requires a MySQL server and ``pyarrow``. A table of synthetic records is created in the
+``{prefix}benchmark_export`` schema on first use (or when ``--rows`` changes) and kept for
+later runs unless ``--drop`` is given. Connection settings are read from ``DJ_HOST``,
+``DJ_USER`` and ``DJ_PASS``.
+
+Usage:
+    python benchmarks/export.py [--rows 1000000] [--partitions 4] [--format csv]
+"""
+
+import argparse
+import time
+from os import environ
+import numpy as np
+import datajoint as dj
+from pharus.connection_pool import ConnectionPool
+from pharus.interface import _DJConnector
+
+
+def make_table(connection: dj.Connection, prefix: str, rows: int):
+    schema = dj.Schema(f"{prefix}benchmark_export", connection=connection)
+
+    @schema
+    class Measurement(dj.Manual):
+        definition = """
+        measurement_id: int
+        ---
+        subject: varchar(32)
+        recorded: datetime
+        duration: time
+        value: double
+        weight: float
+        cost: decimal(8,2)
+        """
+
+    if len(Measurement()) != rows:
+        Measurement.delete_quick()
+        rng = np.random.default_rng(0)
+        for start in range(0, rows, 50000):
+            Measurement.insert(
+                dict(
+                    measurement_id=i,
+                    subject=f"subject{i % 1000}",
+                    recorded=f"2020-01-01 00:00:{i % 60:02}",
+                    duration=f"00:{i % 60:02}:00",
+                    value=value,
+                    weight=value / 3,
+                    cost=round(value * 100, 2),
+                )
+                for i, value in zip(
+                    range(start, min(start + 50000, rows)),
+                    rng.random(min(50000, rows - start)),
+                )
+            )
+    return schema, Measurement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--prefix", default=environ.get("DATABASE_PREFIX", ""))
+    parser.add_argument("--drop", action="store_true")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(max_size=args.partitions)
+    credentials = dict(
+        host=environ["DJ_HOST"], user=environ["DJ_USER"], password=environ["DJ_PASS"]
+    )
+    with pool.connection(**credentials) as connection:
+        schema, Measurement = make_table(connection, args.prefix, args.rows)
+        for partitions in (1, args.partitions):
+            start = time.perf_counter()
+            with _DJConnector._export(
+                Measurement(),
+                export_format=args.format,
+                batch_size=args.batch_size,
+                partitions=partitions,
+            ) as export_file:
+                size = export_file.seek(0, 2)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{partitions} partition(s): {elapsed:8.2f} s"
+                f" {args.rows / elapsed:12,.0f} rows/s"
+                f" {size / elapsed / 2**20:8.2f} MiB/s"
+            )
+        if args.drop:
+            schema.drop(force=True)
+    pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Micro-benchmark of the record conversion done by ``_DJConnector._fetch_records``.
+
+Compares the per-cell if/elif conversion loop that ``_fetch_records`` used to run against
+the per-heading converters of ``_DJConnector._convert_records`` on a wide, synthetic page
+of records. No database is required.
+
+Usage:
+    python benchmarks/fetch_records.py [--rows 1000] [--columns 60] [--repeat 20]
+"""
+
+import argparse
+import datetime
+import decimal
+import math
+import re
+import timeit
+from numbers import Number
+import numpy as np
+from datajoint.heading import Attribute, default_attribute_properties
+from pharus.interface import _DJConnector, DAY
+
+COLUMN_TYPES = (
+    ("int", lambda i: i),
+    ("float", lambda i: np.float32(i / 7)),
+    ("varchar(30)", lambda i: f"name{i}"),
+    ("date", lambda i: datetime.date(2020, 1, 1) + datetime.timedelta(days=i)),
+    ("datetime", lambda i: datetime.datetime(2020, 1, 1, 0, 0, i % 60)),
+    ("time", lambda i: datetime.timedelta(seconds=i)),
+    ("decimal(6,2)", lambda i: decimal.Decimal(i) / 4),
+    ("longblob", None),
+)
+
+
+def make_page(rows: int, columns: int) -> tuple:
+    attributes = {}
+    for c in range(columns):
+        attribute_type, _ = COLUMN_TYPES[c % len(COLUMN_TYPES)]
+        attributes[f"attr{c}"] = Attribute(
+            **dict(
+                default_attribute_properties,
+                name=f"attr{c}",
+                type=attribute_type,
+                is_blob=attribute_type == "longblob",
+            )
+        )
+    records = [
+        {
+            f"attr{c}": make(r)
+            for c, (_, make) in (
+                (c, COLUMN_TYPES[c % len(COLUMN_TYPES)]) for c in range(columns)
+            )
+            if make is not None
+        }
+        for r in range(rows)
+    ]
+    return attributes, records
+
+
+def legacy_convert_records(attributes: dict, records: list, fetch_blobs=False) -> list:
+    # Conversion loop of `_fetch_records` prior to per-heading converters
+    rows = []
+    for non_blobs_row in records:
+        row = []
+        for attribute_name, attribute_info in attributes.items():
+            if not (
+                attribute_info.is_blob
+                or attribute_info.is_attachment
+                or attribute_info.is_filepath
+                or attribute_info.json
+            ):
+                if non_blobs_row[attribute_name] is None:
+                    row.append(None)
+                elif attribute_info.type == "date":
+                    row.append(
+                        (non_blobs_row[attribute_name] - datetime.date(1970, 1, 1)).days
+                        * DAY
+                    )
+                elif attribute_info.type == "time":
+                    row.append(non_blobs_row[attribute_name].total_seconds())
+                elif re.match(r"^datetime.*$", attribute_info.type) or re.match(
+                    r"timestamp", attribute_info.type
+                ):
+                    row.append(
+                        non_blobs_row[attribute_name]
+                        .replace(tzinfo=datetime.timezone.utc)
+                        .timestamp()
+                    )
+                elif attribute_info.type[0:7] == "decimal":
+                    row.append(str(non_blobs_row[attribute_name]))
+                elif isinstance(non_blobs_row[attribute_name], np.generic):
+                    val = non_blobs_row[attribute_name].item()
+                    if isinstance(val, Number) and math.isnan(val):
+                        row.append(str(val))
+                    else:
+                        row.append(val)
+                else:
+                    row.append(non_blobs_row[attribute_name])
+            else:
+                (
+                    row.append(non_blobs_row[attribute_name])
+                    if fetch_blobs
+                    else row.append("=BLOB=")
+                )
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    attributes, records = make_page(args.rows, args.columns)
+    assert legacy_convert_records(attributes, records) == (
+        _DJConnector._convert_records(attributes, records)
+    )
+    legacy = min(
+        timeit.repeat(
+            lambda: legacy_convert_records(attributes, records),
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+    compiled = min(
+        timeit.repeat(
+            lambda: _DJConnector._convert_records(attributes, records),
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+    print(f"{args.rows} rows x {args.columns} columns")
+    print(f"legacy if/elif loop:      {legacy * 1000:8.2f} ms")
+    print(f"per-heading converters:   {compiled * 1000:8.2f} ms")
+    print(f"speedup:                  {legacy / compiled:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
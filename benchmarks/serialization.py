@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the JSON serialization of ``_DJConnector._fetch_records`` responses.
+
+Compares the standard library encoder with ``NumpyEncoder`` against
+``pharus.serialization.dumps`` backed by ``orjson`` on a wide, synthetic page of
+records, as well as on a page of fetched blobs holding NumPy arrays, also encoded as
+Plotly typed arrays. No database is required.
+
+Usage:
+    python benchmarks/serialization.py [--rows 1000] [--columns 60] [--repeat 20]
+"""
+
+import argparse
+import json
+import timeit
+import numpy as np
+from fetch_records import make_page
+from pharus.component_interface import NumpyEncoder
+from pharus.interface import _DJConnector
+from pharus.serialization import dumps, orjson
+
+
+def make_blob_page(rows: int) -> dict:
+    return dict(
+        recordHeader=["id", "trace", "timestamps"],
+        records=[
+            [i, np.random.rand(500), np.arange(500, dtype=np.int64)]
+            for i in range(rows)
+        ],
+        totalCount=rows,
+    )
+
+
+def compare(name: str, payload: dict, repeat: int):
+    assert json.loads(NumpyEncoder.dumps(payload)) == json.loads(dumps(payload))
+    legacy = min(
+        timeit.repeat(lambda: NumpyEncoder.dumps(payload), number=1, repeat=repeat)
+    )
+    fast = min(timeit.repeat(lambda: dumps(payload), number=1, repeat=repeat))
+    print(name)
+    print(f"  NumpyEncoder:           {legacy * 1000:8.2f} ms")
+    print(f"  serialization.dumps:    {fast * 1000:8.2f} ms")
+    print(f"  speedup:                {legacy / fast:8.2f}x")
+
+
+def compare_typed_arrays(name: str, payload: dict, repeat: int):
+    text, typed = NumpyEncoder.dumps(payload), dumps(payload, typed_arrays=True)
+    legacy = min(
+        timeit.repeat(lambda: NumpyEncoder.dumps(payload), number=1, repeat=repeat)
+    )
+    fast = min(
+        timeit.repeat(
+            lambda: dumps(payload, typed_arrays=True), number=1, repeat=repeat
+        )
+    )
+    print(f"{name} as typed arrays")
+    print(f"  NumpyEncoder:           {legacy * 1000:8.2f} ms {len(text):>12,} bytes")
+    print(f"  typed arrays:           {fast * 1000:8.2f} ms {len(typed):>12,} bytes")
+    print(f"  speedup:                {legacy / fast:8.2f}x")
+    print(f"  size reduction:         {len(text) / len(typed):8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed, both serializers use the standard library")
+    attributes, records = make_page(args.rows, args.columns)
+    compare(
+        f"{args.rows} records x {args.columns} attributes",
+        dict(
+            recordHeader=list(attributes),
+            records=_DJConnector._convert_records(attributes, records),
+            totalCount=args.rows,
+        ),
+        args.repeat,
+    )
+    blob_page = make_blob_page(args.rows)
+    compare(f"{args.rows} records with 2 blobs of 500 elements", blob_page, args.repeat)
+    compare_typed_arrays(
+        f"{args.rows} records with 2 blobs of 500 elements", blob_page, args.repeat
+    )
+
+
+if __name__ == "__main__":
+    main()
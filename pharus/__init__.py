@@ -5,12 +5,11 @@ from os import path, environ
 try:
     if path.exists(environ.get("PHARUS_SPEC_PATH")):
         dynamic_api_gen.populate_api()
+        if float(environ.get("PHARUS_SPEC_RELOAD_INTERVAL", 0)) > 0:
+            dynamic_api_gen.watch_spec()
 except TypeError:
     print("No Dynamic API path found")
 
-try:
-    from .dynamic_api import app
-except ImportError:
-    from .server import app
+from .dynamic_api import app
 
 __all__ = ["__version__", "app"]
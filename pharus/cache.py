@@ -0,0 +1,399 @@
+"""Caches shared across requests."""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU cache whose entries expire individually.
+
+    Args:
+        max_entries (optional): Max number of entries kept, least recently used entries
+            are evicted first, defaults to ``1024``.
+        ttl (optional): Default seconds an entry remains valid, defaults to ``300``.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (epoch time the entry expires at, value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, evicted=0)
+
+    def get(self, key, default=None):
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key.
+            default (optional): Value returned on a miss, defaults to ``None``.
+
+        Returns:
+            The cached value if present and not expired, otherwise ``default``.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self._stats["misses"] += 1
+                self._stats["evicted"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None, expires_at: float = None):
+        """
+        Cache a value.
+
+        Args:
+            key: Cache key.
+            value: Value to cache.
+            ttl (optional): Seconds the entry remains valid, defaults to the cache ``ttl``.
+            expires_at (optional): Epoch time after which the entry must no longer be
+                served, e.g. the ``exp`` claim of a token. The entry expires at the
+                earliest of this and ``ttl``.
+        """
+
+        expiry = time.time() + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            expiry = min(expiry, expires_at)
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                # Prefer dropping expired entries over live but least recently used ones
+                now = time.time()
+                for expired_key in [
+                    k for k, (expiry, _) in self._entries.items() if expiry <= now
+                ]:
+                    del self._entries[expired_key]
+                    self._stats["evicted"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+
+    def pop(self, key, default=None):
+        """
+        Remove an entry.
+
+        Args:
+            key: Cache key.
+            default (optional): Value returned if the key is absent, defaults to ``None``.
+
+        Returns:
+            The removed value, otherwise ``default``.
+        """
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Cache usage counters.
+
+        Returns:
+            A dictionary with ``hits``, ``misses``, ``evicted`` and ``size`` counts.
+        """
+
+        with self._lock:
+            return dict(**self._stats, size=len(self._entries))
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of serialized results bounded by their total size, whose
+    entries expire individually and are invalidated by writes to the tables they were
+    read from. Expired entries may still be served for a while as they are refreshed in
+    the background, see :meth:`get_stale` and :meth:`refresh`. Entries are held in
+    memory, so invalidation only applies to the process the cache lives in.
+
+    Args:
+        max_bytes (optional): Max total size of the cached values, least recently used
+            entries are evicted first, defaults to 64 MiB.
+        max_refreshes (optional): Max number of entries refreshed concurrently in the
+            background, defaults to ``2``.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_refreshes: int = 2):
+        self.max_bytes = max_bytes
+        self.max_refreshes = max_refreshes
+        # key -> (epoch time the entry expires at, epoch time it may be served until
+        #         while being refreshed, value, size, tables read from)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Keys being refreshed in the background
+        self._refreshing = set()
+        self._executor = None
+        self._stats = dict(
+            hits=0, misses=0, stale=0, refreshed=0, evicted=0, invalidated=0
+        )
+
+    def get(self, key, default=None):
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key.
+            default (optional): Value returned on a miss, defaults to ``None``.
+
+        Returns:
+            The cached value if present and not expired, otherwise ``default``.
+        """
+
+        value, fresh = self.get_stale(key, (default, False))
+        return value if fresh else default
+
+    def get_stale(self, key, default=None):
+        """
+        Get a cached value, even if it expired less than its max staleness ago.
+
+        Args:
+            key: Cache key.
+            default (optional): Value returned on a miss, defaults to ``None``.
+
+        Returns:
+            A ``(value, fresh)`` tuple if present and not past its max staleness,
+                otherwise ``default``.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._remove(key)
+                    self._stats["evicted"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            fresh = entry[0] > now
+            self._stats["hits" if fresh else "stale"] += 1
+            return entry[2], fresh
+
+    def set(
+        self, key, value, ttl: float, size: int = None, tables=(), max_stale: float = 0
+    ):
+        """
+        Cache a value.
+
+        Args:
+            key: Cache key.
+            value: Value to cache.
+            ttl: Seconds the entry remains valid.
+            size (optional): Size of the value in bytes, defaults to ``len(value)``.
+                Values larger than ``max_bytes`` are not cached.
+            tables (optional): Full names of the tables the value was read from, see
+                :meth:`invalidate`.
+            max_stale (optional): Seconds the entry may still be served after it
+                expired, while it is refreshed, defaults to ``0``.
+        """
+
+        size = len(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        expiry = time.time() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (
+                expiry,
+                expiry + max_stale,
+                value,
+                size,
+                frozenset(tables),
+            )
+            self._bytes += size
+            if self._bytes > self.max_bytes:
+                # Prefer dropping expired entries over live but least recently used ones
+                now = time.time()
+                for expired_key in [
+                    k for k, entry in self._entries.items() if entry[1] <= now
+                ]:
+                    self._remove(expired_key)
+                    self._stats["evicted"] += 1
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+
+    def refresh(self, key, compute) -> bool:
+        """
+        Refresh an entry in the background unless it is already being refreshed or
+        ``max_refreshes`` entries are. Failures are ignored, leaving the entry to expire
+        at its max staleness.
+
+        Args:
+            key: Cache key.
+            compute: Function computing the value and caching it with :meth:`set`.
+
+        Returns:
+            Whether a refresh was started.
+        """
+
+        with self._lock:
+            if key in self._refreshing or len(self._refreshing) >= self.max_refreshes:
+                return False
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_refreshes, thread_name_prefix="pharus-refresh"
+                )
+
+        def run():
+            try:
+                compute()
+                with self._lock:
+                    self._stats["refreshed"] += 1
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+        return True
+
+    def invalidate(self, tables):
+        """
+        Remove the entries read from any of the given tables.
+
+        Args:
+            tables: Full names of modified tables, e.g. ``["`schema`.`table`"]``.
+        """
+
+        tables = set(tables)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[4] & tables]:
+                self._remove(key)
+                self._stats["invalidated"] += 1
+
+    def discard(self, predicate):
+        """
+        Remove the entries whose key satisfies a predicate, e.g. when what they were
+        computed from changed.
+
+        Args:
+            predicate: Function of a key returning whether to remove its entry.
+        """
+
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self._remove(key)
+                self._stats["invalidated"] += 1
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Cache usage counters.
+
+        Returns:
+            A dictionary with ``hits``, ``misses``, ``stale`` (expired entries served),
+                ``refreshed``, ``evicted``, ``invalidated``, ``size`` and ``bytes``
+                counts.
+        """
+
+        with self._lock:
+            return dict(**self._stats, size=len(self._entries), bytes=self._bytes)
+
+    def _remove(self, key):
+        # Must be called while holding the lock
+        self._bytes -= self._entries.pop(key)[3]
+
+
+class _Flight:
+    """Execution shared by concurrent calls of :meth:`SingleFlight.do`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-safe coalescing of concurrent identical calls: the first call for a key
+    executes while the others wait for and share its result.
+    """
+
+    def __init__(self):
+        # key -> flight of the call in progress
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = dict(executed=0, coalesced=0)
+
+    def do(self, key, function) -> tuple:
+        """
+        Call a function unless a call with the same key is in progress, in which case
+        wait for it to complete instead.
+
+        Args:
+            key: Key identifying identical calls.
+            function: Function to call.
+
+        Returns:
+            A ``(result, shared)`` tuple where ``shared`` tells whether the result is
+                the one of another call, which must then not be mutated. Exceptions of
+                that call are raised as well.
+        """
+
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._stats["executed"] += 1
+                leader = True
+            else:
+                self._stats["coalesced"] += 1
+                leader = False
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = function()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self) -> dict:
+        """
+        Coalescing counters.
+
+        Returns:
+            A dictionary with ``executed``, ``coalesced`` and ``inFlight`` counts.
+        """
+
+        with self._lock:
+            return dict(**self._stats, inFlight=len(self._flights))
@@ -4,10 +4,19 @@ from base64 import b64decode
 import json
 import datajoint as dj
 import re
+import hashlib
 import inspect
 from datetime import date, datetime
-from flask import request, send_file
-from .interface import _DJConnector
+from flask import (
+    Response,
+    copy_current_request_context,
+    make_response,
+    request,
+    send_file,
+)
+from .interface import _DJConnector, _result_cache, _single_flight
+from .connection_pool import ConnectionPool
+from .serialization import dumps, typed_array
 import os
 from pathlib import Path
 import types
@@ -17,6 +26,7 @@ from uuid import UUID
 import cv2
 import base64
 from dateutil import parser
+from functools import cached_property, lru_cache
 
 
 class NumpyEncoder(json.JSONEncoder):
@@ -37,7 +47,18 @@ class NumpyEncoder(json.JSONEncoder):
         np.ndarray: list,
     }
 
+    def __init__(self, *args, typed_arrays: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Encode numeric arrays as Plotly typed arrays, see `serialization.typed_array`
+        self.typed_arrays = typed_arrays
+
     def default(self, o):
+        if (
+            self.typed_arrays
+            and type(o) is np.ndarray
+            and (typed := typed_array(o)) is not None
+        ):
+            return typed
         if type(o) in self.npmap:
             return self.npmap[type(o)](o)
         if type(o) is UUID:
@@ -49,8 +70,211 @@ class NumpyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
     @classmethod
-    def dumps(cls, obj):
-        return json.dumps(obj, cls=cls)
+    def dumps(cls, obj, typed_arrays: bool = False):
+        return json.dumps(obj, cls=cls, typed_arrays=typed_arrays)
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+
+def requested_mimetype() -> str:
+    """
+    Media type of records preferred by the client.
+
+    Returns:
+        Best match of the ``Accept`` header among ``application/json`` (default),
+            ``application/x-ndjson`` and ``application/vnd.apache.arrow.stream``.
+    """
+    return request.accept_mimetypes.best_match(
+        ["application/json", NDJSON_MIMETYPE, ARROW_MIMETYPE], "application/json"
+    )
+
+
+def stream_records(mimetype: str, **kwargs) -> Response:
+    """
+    Stream all records of a query as newline-delimited JSON or Apache Arrow IPC.
+
+    Args:
+        mimetype: ``application/x-ndjson`` or ``application/vnd.apache.arrow.stream``.
+        kwargs: Keyword arguments of ``_DJConnector._stream_records`` or
+            ``_DJConnector._stream_arrow``.
+
+    Returns:
+        Streamed response.
+    """
+    if mimetype == ARROW_MIMETYPE:
+        return stream_arrow(*_DJConnector._stream_arrow(**kwargs))
+    return stream_ndjson(*_DJConnector._stream_records(**kwargs))
+
+
+def stream_ndjson(record_header: list, batches) -> Response:
+    """
+    Stream records as newline-delimited JSON, one object per record.
+
+    Args:
+        record_header: Attribute headers.
+        batches: Iterable of batches of records, see ``_DJConnector._stream_records``.
+
+    Returns:
+        Streamed ``application/x-ndjson`` response.
+    """
+
+    def lines():
+        for records in batches:
+            yield "".join(
+                dumps(dict(zip(record_header, record))) + "\n" for record in records
+            )
+
+    return Response(lines(), mimetype=NDJSON_MIMETYPE)
+
+
+def stream_arrow(schema, batches) -> Response:
+    """
+    Stream records in the Apache Arrow IPC streaming format, one message per batch.
+
+    Args:
+        schema: Arrow schema of the records.
+        batches: Iterable of ``pyarrow.RecordBatch``, see ``_DJConnector._stream_arrow``.
+
+    Returns:
+        Streamed ``application/vnd.apache.arrow.stream`` response.
+    """
+
+    import pyarrow as pa
+
+    def messages():
+        sink = io.BytesIO()
+
+        def flush():
+            message = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+            return message
+
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield flush()
+        # End-of-stream marker
+        yield flush()
+
+    return Response(messages(), mimetype=ARROW_MIMETYPE)
+
+
+# Names of the functions defined by the code blocks of a component in the spec
+SPEC_FUNCTIONS = ("dj_query", "restriction", "presets")
+
+
+@lru_cache(maxsize=None)
+def compile_spec_function(source: str, name: str) -> tuple:
+    """
+    Compile a function defined by a code block of the spec, once per distinct block.
+    The block runs with this module's globals, as the spec may use anything imported
+    here.
+
+    Args:
+        source: Code block defining the function.
+        name: Name of the function, e.g. ``dj_query``.
+
+    Returns:
+        A ``(function, argument names)`` tuple.
+    """
+
+    namespace = {}
+    exec(compile(source, f"<spec {name}>", "exec"), globals(), namespace)
+    function = namespace[name]
+    return function, tuple(inspect.getfullargspec(function).args)
+
+
+@lru_cache(maxsize=None)
+def reads_request(function) -> bool:
+    """
+    Whether a function of the spec refers to the request, e.g. to build its query from
+    the request arguments, in which case its result cannot be reused across requests.
+
+    Args:
+        function: Function compiled from the spec.
+
+    Returns:
+        ``True`` if the function or any function nested in it uses ``request``. Other
+            functions it calls are not inspected.
+    """
+
+    codes = [function.__code__]
+    while codes:
+        code = codes.pop()
+        if "request" in code.co_names:
+            return True
+        codes.extend(c for c in code.co_consts if inspect.iscode(c))
+    return False
+
+
+def compile_spec(component_config: dict):
+    """
+    Compile the code blocks of a component in the spec, e.g. when the API is built,
+    so that requests only bind them to a connection.
+
+    Args:
+        component_config: Configuration of the component in the spec.
+    """
+
+    for name in SPEC_FUNCTIONS:
+        if name in component_config:
+            compile_spec_function(component_config[name], name)
+
+
+def entity_tag(query, *key) -> str:
+    """
+    Entity tag of the response to the current request, derived from the query, the
+    request path, arguments and ``Accept`` header, ``key`` and the modification state
+    of the tables the query reads from.
+
+    Args:
+        query: Any datajoint object related to QueryExpression the response is made of.
+        key: Anything else the response depends on.
+
+    Returns:
+        Entity tag.
+    """
+
+    return _DJConnector._etag(
+        query,
+        request.path,
+        sorted(request.args.items(multi=True)),
+        request.headers.get("Accept"),
+        *key,
+    )
+
+
+def conditional_response(query, respond, *key) -> Response:
+    """
+    Respond to a GET request unless the client's cached copy is still current.
+
+    A request whose ``If-None-Match`` header lists the weak ``entity_tag`` of the
+    response gets ``304 Not Modified`` without the query being run. Responses already
+    carrying an ``ETag``, e.g. served from the result cache, keep it.
+
+    Args:
+        query: Any datajoint object related to QueryExpression the response is made of.
+        respond: Function returning the response (or a value accepted by
+            ``flask.make_response``) when it has to be sent.
+        key: Anything else the response depends on.
+
+    Returns:
+        Response carrying an ``ETag`` header.
+    """
+
+    if request.method not in ("GET", "HEAD"):
+        return make_response(respond())
+    etag = entity_tag(query, *key)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(respond())
+    if response.status_code in (200, 304) and response.get_etag()[0] is None:
+        response.set_etag(etag, weak=True)
+    return response
 
 
 class Component:
@@ -75,9 +299,24 @@ class Component:
             self.width = component_config["width"]
         if static_config:
             self.static_variables = types.MappingProxyType(static_config)
+        self.component_config = component_config
+        self.static_config = static_config
         self.connection = connection
         self.payload = payload
 
+    def respond(self, method_name: str):
+        """
+        Respond to a request with one of the component's routes.
+
+        Args:
+            method_name: Name of the route method, e.g. ``dj_query_route``.
+
+        Returns:
+            Return value of the route method.
+        """
+
+        return getattr(self, method_name)()
+
 
 class FetchComponent(Component):
     rest_verb = ["GET"]
@@ -85,29 +324,57 @@ class FetchComponent(Component):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         component_config = kwargs.get("component_config", args[1] if args else None)
-        lcls = locals()
-        exec(component_config["dj_query"], globals(), lcls)
-        self.dj_query = lcls["dj_query"]
+        self.dj_query, dj_query_args = compile_spec_function(
+            component_config["dj_query"], "dj_query"
+        )
         if "restriction" in component_config:
-            exec(component_config["restriction"], globals(), lcls)
-            self.dj_restriction = lcls["restriction"]
+            self.dj_restriction = compile_spec_function(
+                component_config["restriction"], "restriction"
+            )[0]
         else:
             self.dj_restriction = lambda: dict()
+        # Seconds responses are cached for, and may be served for after that while
+        # they are refreshed in the background, see `cached_respond`
+        self.cache_ttl = float(
+            component_config.get(
+                "cache_ttl", os.environ.get("PHARUS_RESULT_CACHE_TTL", 0)
+            )
+        )
+        self.cache_max_stale = float(
+            component_config.get(
+                "cache_max_stale", os.environ.get("PHARUS_RESULT_CACHE_MAX_STALE", 0)
+            )
+        )
+        # Reuse the query built by `dj_query` across requests on the same connection,
+        # see `fetch_metadata`
+        self.reuse_query = component_config.get("reuse_query", False)
         self.vm_list = [
-            dj.VirtualModule(
-                s,
-                s.replace("__", "-"),
-                connection=self.connection,
+            _DJConnector._get_virtual_module(
+                self.connection, s.replace("__", "-"), module_name=s
             )
-            for s in inspect.getfullargspec(self.dj_query).args
+            for s in dj_query_args
         ]
 
-    @property
+    @cached_property
     def fetch_metadata(self):
-        return self.dj_query(*self.vm_list)
+        # Query built once per request. With `reuse_query` set in the spec, it is reused
+        # across requests on the same connection as long as the virtual modules it is
+        # built from are current. Only `dj_query` using the request itself is detected
+        # and never reused, not one calling code which does, hence the opt-in
+        if not self.reuse_query or reads_request(self.dj_query):
+            return self.dj_query(*self.vm_list)
+        fetch_metadata = vars(self.connection).setdefault("_pharus_fetch_metadata", {})
+        cached = fetch_metadata.get(self.dj_query)
+        if cached is None or any(a is not b for a, b in zip(cached[0], self.vm_list)):
+            cached = fetch_metadata[self.dj_query] = (
+                self.vm_list,
+                self.dj_query(*self.vm_list),
+            )
+        return cached[1]
 
     @property
     def restriction(self):
+        attributes = self.fetch_metadata["query"].heading.attributes
         # first element includes the spec's restriction,
         # second element includes the restriction from query parameters
         return dj.AndList(
@@ -116,27 +383,177 @@ class FetchComponent(Component):
                 {
                     k: (
                         datetime.fromtimestamp(float(v)).isoformat()
-                        if re.match(
-                            r"^date.*$",
-                            self.fetch_metadata["query"].heading.attributes[k].type,
-                        )
+                        if re.match(r"^date.*$", attributes[k].type)
                         else v
                     )
                     for k, v in request.args.items()
-                    if k in self.fetch_metadata["query"].heading.attributes
+                    if k in attributes
                 },
             ]
         )
 
+    def respond(self, method_name: str):
+        """
+        Respond to a request with one of the component's routes, or with ``304 Not
+        Modified`` if the tables it reads from did not change since the client's cached
+        copy was sent. See ``conditional_response``.
+
+        Args:
+            method_name: Name of the route method, e.g. ``dj_query_route``.
+
+        Returns:
+            Response of the route method.
+        """
+
+        query = self.fetch_metadata["query"] & self.restriction
+        return conditional_response(
+            query,
+            lambda: self.cached_respond(query, method_name),
+            *self.response_key(method_name),
+        )
+
+    @cached_property
+    def config_digest(self) -> str:
+        # Responses also depend on the component's configuration in the spec, e.g. its
+        # count policy or typed arrays, which may change with a reload of the spec
+        return hashlib.sha256(
+            repr((self.component_config, self.static_config)).encode()
+        ).hexdigest()
+
+    def response_key(self, method_name: str) -> tuple:
+        """
+        What a response of the component depends on besides its query and the request.
+
+        Args:
+            method_name: Name of the route method, e.g. ``dj_query_route``.
+
+        Returns:
+            The component class, route method, fetch arguments and configuration.
+        """
+
+        return (
+            type(self).__name__,
+            method_name,
+            repr(self.fetch_metadata["fetch_args"]),
+            self.config_digest,
+        )
+
+    def cached_respond(self, query, method_name: str):
+        """
+        Respond to a request with one of the component's routes, serving the serialized
+        response from the result cache for ``cache_ttl`` seconds. Responses are cached
+        per database user and invalidated by writes made through pharus to the tables
+        they were read from. Streamed responses are never cached.
+
+        With ``cache_max_stale`` set, an expired response is still served for up to
+        that many seconds while it is refreshed in the background on another pooled
+        connection (stale-while-revalidate).
+
+        Concurrent identical requests, i.e. of the same database user with the same
+        query and arguments, are coalesced into a single execution of the route whose
+        response they share, whether or not caching is enabled.
+
+        Args:
+            query: Query the response is made of.
+            method_name: Name of the route method, e.g. ``dj_query_route``.
+
+        Returns:
+            Response of the route method.
+        """
+
+        key = (
+            self.route,
+            *self.response_key(method_name),
+            self.connection.conn_info["host"],
+            self.connection.conn_info["user"],
+            query.make_sql(),
+            tuple(sorted(request.args.items(multi=True))),
+            request.headers.get("Accept"),
+        )
+        if not self.cache_ttl or (cached := _result_cache.get_stale(key)) is None:
+            (response, cached), shared = _single_flight.do(
+                key, lambda: self._cache_response(key, query, method_name)
+            )
+            if cached is None:
+                # Responses which cannot be shared are made by each request
+                return (
+                    make_response(super().respond(method_name)) if shared else response
+                )
+        else:
+            cached, fresh = cached
+            if not fresh:
+                _result_cache.refresh(
+                    key,
+                    copy_current_request_context(
+                        lambda: self._refresh(key, method_name)
+                    ),
+                )
+        body, content_type, etag = cached
+        response = Response(body, content_type=content_type)
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _cache_response(self, key: tuple, query, method_name: str) -> tuple:
+        # Tag the response before running the query so that a concurrent write changes
+        # the tag of later responses
+        etag = (
+            entity_tag(query, *self.response_key(method_name))
+            if self.cache_ttl
+            else None
+        )
+        response = make_response(super().respond(method_name))
+        if (
+            response.status_code != 200
+            or response.is_streamed
+            or response.direct_passthrough
+        ):
+            return response, None
+        cached = (response.get_data(), response.content_type, etag)
+        if self.cache_ttl:
+            _result_cache.set(
+                key,
+                cached,
+                ttl=self.cache_ttl,
+                size=len(cached[0]),
+                tables=_DJConnector._table_names(query),
+                max_stale=self.cache_max_stale,
+            )
+        return response, cached
+
+    def _refresh(self, key: tuple, method_name: str):
+        # The request's connection is given back to its pool once the response is sent
+        with ConnectionPool.sibling(self.connection) as connection:
+            if connection is None:
+                return
+            component = type(self)(
+                name=self.name,
+                component_config=self.component_config,
+                static_config=self.static_config,
+                connection=connection,
+                payload=self.payload,
+            )
+            component._cache_response(
+                key,
+                component.fetch_metadata["query"] & component.restriction,
+                method_name,
+            )
+
     def dj_query_route(self):
         fetch_metadata = self.fetch_metadata
+        if (mimetype := requested_mimetype()) == ARROW_MIMETYPE:
+            return stream_records(
+                mimetype,
+                query=fetch_metadata["query"] & self.restriction,
+                fetch_args=fetch_metadata["fetch_args"],
+            )
         record_header, table_records, total_count = _DJConnector._fetch_records(
             query=fetch_metadata["query"] & self.restriction,
             fetch_args=fetch_metadata["fetch_args"],
         )
 
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 dict(
                     recordHeader=record_header,
                     records=table_records,
@@ -181,7 +598,7 @@ class SlideshowComponent(FetchComponent):
             payload_size += 1
 
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 {
                     "frameMeta": {
                         "fps": 50,
@@ -220,21 +637,13 @@ class InsertComponent(Component):
         self.tables = [
             (
                 getattr(
-                    dj.VirtualModule(
-                        s,
-                        s,
-                        connection=self.connection,
-                    ),
+                    _DJConnector._get_virtual_module(self.connection, s),
                     t[0],
                 )
                 if len(t) == 1
                 else getattr(
                     getattr(
-                        dj.VirtualModule(
-                            s,
-                            s,
-                            connection=self.connection,
-                        ),
+                        _DJConnector._get_virtual_module(self.connection, s),
                         t[0],
                     ),
                     t[1],
@@ -277,17 +686,15 @@ class InsertComponent(Component):
         print(self.nullable_lookup, flush=True)
 
         if "presets" in self.component_config:
-            lcls = locals()
-            exec(self.component_config["presets"], globals(), lcls)
-            self.presets = lcls["presets"]
+            self.presets, presets_args = compile_spec_function(
+                self.component_config["presets"], "presets"
+            )
 
             self.preset_vm_list = [
-                dj.VirtualModule(
-                    s,
-                    s.replace("__", "-"),
-                    connection=self.connection,
+                _DJConnector._get_virtual_module(
+                    self.connection, s.replace("__", "-"), module_name=s
                 )
-                for s in inspect.getfullargspec(self.presets).args
+                for s in presets_args
             ]
 
     @property
@@ -308,6 +715,7 @@ class InsertComponent(Component):
                         for r in self.payload["submissions"]
                     ]
                 )
+        _result_cache.invalidate([t.full_table_name for t in self.tables])
         return {"response": "Insert Successful"}
 
     def fields_route(self):
@@ -315,6 +723,7 @@ class InsertComponent(Component):
         source_fields = {
             **{
                 (p_name := f"{p.database}.{dj.utils.to_camel_case(p.table_name)}"): {
+                    # Values are matched as strings so keep the standard formatting
                     "values": (
                         [NumpyEncoder.dumps(row) for row in p.fetch("KEY")]
                         if not all(k in self.nullable_lookup for k in p.primary_key)
@@ -440,7 +849,7 @@ class InsertComponent(Component):
             )
 
         return (
-            NumpyEncoder.dumps(filtered_preset_dictionary),
+            dumps(filtered_preset_dictionary),
             200,
             {"Content-Type": "application/json"},
         )
@@ -452,6 +861,9 @@ class TableComponent(FetchComponent):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        component_config = kwargs.get("component_config", args[1] if args else None)
+        # Count policy of `totalCount`, see `_DJConnector._count`
+        self.count = component_config.get("count", "exact")
         self.frontend_map = {
             "source": "sci-viz/src/Components/Table/TableView.tsx",
             "target": "TableView",
@@ -494,7 +906,27 @@ class TableComponent(FetchComponent):
     # Returns the result of djquery with paging, sorting, filtering
     def dj_query_route(self):
         fetch_metadata = self.fetch_metadata
-        record_header, table_records, total_count = _DJConnector._fetch_records(
+        if (mimetype := requested_mimetype()) != "application/json":
+            return stream_records(
+                mimetype,
+                query=fetch_metadata["query"] & self.restriction,
+                fetch_args=fetch_metadata["fetch_args"],
+                order=(
+                    request.args["order"].split(",")
+                    if "order" in request.args
+                    else None
+                ),
+                restriction=(
+                    json.loads(b64decode(request.args["restriction"]))
+                    if "restriction" in request.args
+                    else []
+                ),
+            )
+        # Column-major records are opt-in with `format=columnar`
+        columnar = request.args.get("format") == "columnar"
+        record_header, table_records, total_count, *next_cursor = (
+            _DJConnector._fetch_columns if columnar else _DJConnector._fetch_records
+        )(
             query=fetch_metadata["query"] & self.restriction,
             fetch_args=fetch_metadata["fetch_args"],
             limit=int(request.args["limit"]) if "limit" in request.args else 1000,
@@ -505,14 +937,18 @@ class TableComponent(FetchComponent):
                 if "restriction" in request.args
                 else []
             ),
+            # Keyset paging is opt-in with `cursor`, empty for the first page
+            cursor=request.args.get("cursor"),
+            count=request.args.get("count", self.count),
         )
 
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 dict(
                     recordHeader=record_header,
-                    records=table_records,
+                    **{"columns" if columnar else "records": table_records},
                     totalCount=total_count,
+                    **{"nextCursor": c for c in next_cursor},
                 )
             ),
             200,
@@ -524,7 +960,7 @@ class TableComponent(FetchComponent):
             self.fetch_metadata["query"] & self.restriction
         )
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 dict(
                     attributeHeaders=attributes_meta["attribute_headers"],
                     attributes=attributes_meta["attributes"],
@@ -566,7 +1002,7 @@ class TableComponent(FetchComponent):
                 )
 
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 dict(
                     unique_values=query_attributes,
                 )
@@ -617,7 +1053,7 @@ class MetadataComponent(TableComponent):
             fetch_args=fetch_metadata["fetch_args"],
         )
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 dict(
                     recordHeader=record_header,
                     records=table_records,
@@ -632,6 +1068,9 @@ class MetadataComponent(TableComponent):
 class PlotPlotlyStoredjsonComponent(FetchComponent):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        component_config = kwargs.get("component_config", args[1] if args else None)
+        # Encode numeric arrays of the figure as Plotly typed arrays
+        self.typed_arrays = component_config.get("typed_arrays", False)
         self.frontend_map = {
             "source": "sci-viz/src/Components/Plots/FullPlotly.tsx",
             "target": "FullPlotly",
@@ -652,10 +1091,11 @@ class PlotPlotlyStoredjsonComponent(FetchComponent):
     def dj_query_route(self):
         fetch_metadata = self.fetch_metadata
         return (
-            NumpyEncoder.dumps(
+            dumps(
                 (fetch_metadata["query"] & self.restriction).fetch1(
                     *fetch_metadata["fetch_args"]
-                )
+                ),
+                typed_arrays=self.typed_arrays,
             ),
             200,
             {"Content-Type": "application/json"},
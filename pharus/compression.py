@@ -0,0 +1,204 @@
+"""Response compression negotiated with ``Accept-Encoding``."""
+
+import zlib
+from os import environ
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.apache.arrow.stream",
+    "application/javascript",
+    "image/svg+xml",
+)
+# Default compression level of each encoding
+DEFAULT_LEVELS = dict(zstd=3, br=4, gzip=6)
+# Range of the compression levels of each encoding
+LEVEL_RANGES = dict(zstd=(1, 22), br=(0, 11), gzip=(0, 9))
+
+
+class _Compressor:
+    """
+    Incremental compressor of a content encoding.
+
+    Args:
+        encoding: ``zstd``, ``br`` or ``gzip``.
+        level: Compression level, whose range depends on the encoding.
+    """
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a chunk of data, buffering it as the encoding sees fit.
+
+        Args:
+            data: Chunk of data.
+
+        Returns:
+            Compressed data available so far.
+        """
+
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """
+        Flush buffered data so that the client can decode what was compressed so far.
+
+        Returns:
+            Compressed data.
+        """
+
+        if self.encoding == "zstd":
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        elif self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """
+        End the compressed stream.
+
+        Returns:
+            Remaining compressed data.
+        """
+
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class _CompressedStream:
+    """
+    Iterable compressing each chunk of a streamed response as it is sent. Closing it
+    closes the original iterable so that its clean up, e.g. returning a connection to
+    its pool, still happens.
+
+    Args:
+        response: Streamed response.
+        compressor: Compressor of the negotiated encoding.
+    """
+
+    def __init__(self, response: Response, compressor: _Compressor):
+        self._original = response.response
+        self._chunks = response.iter_encoded()
+        self._compressor = compressor
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            compressed = self._compressor.compress(chunk) + self._compressor.flush()
+            if compressed:
+                yield compressed
+        yield self._compressor.finish()
+
+    def close(self):
+        if hasattr(self._original, "close"):
+            self._original.close()
+
+
+def available_encodings() -> list:
+    """
+    Content encodings offered to clients, in order of preference.
+
+    Returns:
+        Encodings listed in ``PHARUS_COMPRESSION_ENCODINGS`` (defaults to
+            ``zstd,br,gzip``) whose library is installed.
+    """
+
+    return [
+        encoding
+        for encoding in environ.get(
+            "PHARUS_COMPRESSION_ENCODINGS", "zstd,br,gzip"
+        ).split(",")
+        if (encoding == "zstd" and zstandard)
+        or (encoding == "br" and brotli)
+        or encoding == "gzip"
+    ]
+
+
+def compression_level(encoding: str) -> int:
+    """
+    Compression level of an encoding.
+
+    Args:
+        encoding: ``zstd``, ``br`` or ``gzip``.
+
+    Returns:
+        ``PHARUS_COMPRESSION_LEVEL_ZSTD``, ``PHARUS_COMPRESSION_LEVEL_BR`` or
+            ``PHARUS_COMPRESSION_LEVEL_GZIP`` respectively, else
+            ``PHARUS_COMPRESSION_LEVEL``, else the default level of the encoding, clamped
+            to the range of levels the encoding supports.
+    """
+
+    level = int(
+        environ.get(
+            f"PHARUS_COMPRESSION_LEVEL_{encoding.upper()}",
+            environ.get("PHARUS_COMPRESSION_LEVEL", DEFAULT_LEVELS[encoding]),
+        )
+    )
+    low, high = LEVEL_RANGES[encoding]
+    return min(max(level, low), high)
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Compress a response with the best encoding accepted by the client. Meant to be
+    registered with ``app.after_request`` so that it applies to every route.
+
+    Only JSON, NDJSON, Arrow and text responses are compressed. Responses smaller than
+    ``PHARUS_COMPRESSION_MIN_SIZE`` bytes (defaults to 1024) are sent as is while
+    streamed responses are compressed chunk by chunk. See :func:`compression_level`
+    for the level of each encoding.
+
+    Args:
+        response: Response of a route.
+
+    Returns:
+        The response, compressed if applicable.
+    """
+
+    if (
+        request.method == "HEAD"
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or not (
+            response.mimetype.startswith("text/")
+            or response.mimetype in COMPRESSIBLE_MIMETYPES
+        )
+    ):
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+    compressor = _Compressor(encoding, compression_level(encoding))
+    response.vary.add("Accept-Encoding")
+    if response.is_streamed or response.direct_passthrough:
+        response.response = _CompressedStream(response, compressor)
+        response.direct_passthrough = False
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < int(environ.get("PHARUS_COMPRESSION_MIN_SIZE", 1024)):
+            return response
+        response.set_data(compressor.compress(data) + compressor.finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
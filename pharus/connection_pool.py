@@ -0,0 +1,276 @@
+"""Pool of reusable DataJoint connections."""
+
+import datajoint as dj
+import hashlib
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from .error import ConnectionPoolExhausted
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DataJoint connections keyed by credentials.
+
+    Connections are keyed by ``(host, user, sha256(password))`` so that repeated requests
+    bearing the same credentials reuse a warm connection instead of paying for a new TCP
+    handshake and MySQL authentication.
+
+    Args:
+        max_size (optional): Max number of open connections per key, defaults to ``8``.
+        idle_timeout (optional): Seconds an idle connection may remain in the pool before
+            it is closed, defaults to ``300``.
+        checkout_timeout (optional): Seconds to wait for a connection to be returned when
+            ``max_size`` has been reached, defaults to ``30``.
+        max_uses (optional): Number of checkouts after which a connection is recycled,
+            defaults to ``None`` (never).
+        max_lifetime (optional): Seconds after which a connection is recycled, defaults
+            to ``None`` (never).
+    """
+
+    def __init__(
+        self,
+        max_size: int = 8,
+        idle_timeout: float = 300,
+        checkout_timeout: float = 30,
+        max_uses: int = None,
+        max_lifetime: float = None,
+    ):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.max_uses = max_uses
+        self.max_lifetime = max_lifetime
+        # key -> deque of (connection, time returned to the pool)
+        self._idle = defaultdict(deque)
+        # key -> number of open connections (idle and checked out)
+        self._open = defaultdict(int)
+        # id(connection) -> key for connections currently checked out
+        self._checked_out = {}
+        # id(connection) -> [time opened, number of checkouts] for open connections
+        self._usage = {}
+        self._condition = threading.Condition()
+        self._stats = dict(hits=0, misses=0, evicted=0, recycled=0)
+
+    @staticmethod
+    def _key(host: str, user: str, password: str) -> tuple:
+        return (host, user, hashlib.sha256(password.encode()).hexdigest())
+
+    def checkout(
+        self, host: str, user: str, password: str, timeout: float = None
+    ) -> dj.Connection:
+        """
+        Check out a live connection, reusing an idle one when available.
+
+        Args:
+            host: Database address.
+            user: Database user.
+            password: Database password (or OIDC access token).
+            timeout (optional): Seconds to wait for a connection to be returned when
+                ``max_size`` has been reached, defaults to ``checkout_timeout``.
+
+        Returns:
+            A DataJoint connection that must be given back using :meth:`release`.
+        """
+
+        key = self._key(host, user, password)
+        deadline = time.monotonic() + (
+            self.checkout_timeout if timeout is None else timeout
+        )
+        while True:
+            with self._condition:
+                self._evict_idle()
+                while not self._idle[key] and self._open[key] >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ConnectionPoolExhausted(
+                            f"No connection available for {user}@{host}"
+                        )
+                    self._condition.wait(remaining)
+                    self._evict_idle()
+                if self._idle[key]:
+                    # Most recently returned connection is the least likely to be stale
+                    connection, _ = self._idle[key].pop()
+                else:
+                    connection = None
+                    self._open[key] += 1
+            if connection is None:
+                try:
+                    connection = dj.Connection(host=host, user=user, password=password)
+                except Exception:
+                    self._discard(key)
+                    raise
+                # Owning pool and credentials, to check out siblings of this connection
+                vars(connection)["_pharus_pool"] = (self, (host, user, password))
+                with self._condition:
+                    self._stats["misses"] += 1
+                    self._checked_out[id(connection)] = key
+                    self._usage[id(connection)] = [time.monotonic(), 1]
+                return connection
+            if self._expired(connection):
+                self._discard(key, connection, recycled=True)
+                continue
+            # Liveness ping happens outside of the lock since it is network bound
+            if connection.is_connected:
+                with self._condition:
+                    self._stats["hits"] += 1
+                    self._checked_out[id(connection)] = key
+                    self._usage[id(connection)][1] += 1
+                return connection
+            self._discard(key, connection, evicted=True)
+
+    def release(self, connection: dj.Connection):
+        """
+        Return a checked out connection to the pool.
+
+        Args:
+            connection: Connection previously obtained with :meth:`checkout`.
+        """
+
+        with self._condition:
+            key = self._checked_out.pop(id(connection), None)
+        if key is None:
+            connection.close()
+            return
+        if self._expired(connection):
+            self._discard(key, connection, recycled=True)
+            return
+        try:
+            if connection.in_transaction:
+                connection.cancel_transaction()
+        except Exception:
+            self._discard(key, connection)
+            return
+        with self._condition:
+            self._idle[key].append((connection, time.monotonic()))
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self, host: str, user: str, password: str):
+        """
+        Request-scoped checkout that always returns the connection to the pool.
+
+        Args:
+            host: Database address.
+            user: Database user.
+            password: Database password (or OIDC access token).
+
+        Yields:
+            A DataJoint connection.
+        """
+
+        connection = self.checkout(host, user, password)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    @staticmethod
+    @contextmanager
+    def sibling(connection: dj.Connection):
+        """
+        Check out a second connection with the same credentials as a pooled connection
+        without waiting, e.g. to run a query concurrently on another thread.
+
+        Args:
+            connection: Connection checked out from a pool.
+
+        Yields:
+            A DataJoint connection, or ``None`` if ``connection`` is not pooled or no
+                connection is available right away.
+        """
+
+        pool, credentials = vars(connection).get("_pharus_pool", (None, None))
+        try:
+            sibling = None if pool is None else pool.checkout(*credentials, timeout=0)
+        except Exception:
+            sibling = None
+        try:
+            yield sibling
+        finally:
+            if sibling is not None:
+                pool.release(sibling)
+
+    def stats(self) -> dict:
+        """
+        Pool usage counters for capacity planning.
+
+        Returns:
+            A dictionary with ``hits``, ``misses``, ``evicted``, ``recycled``, ``open``,
+                ``idle`` and ``checkedOut`` counts.
+        """
+
+        with self._condition:
+            self._evict_idle()
+            return dict(
+                **self._stats,
+                open=sum(self._open.values()),
+                idle=sum(len(idle) for idle in self._idle.values()),
+                checkedOut=len(self._checked_out),
+            )
+
+    def close_all(self):
+        """
+        Close every idle connection held by the pool.
+        """
+
+        with self._condition:
+            for key, idle in list(self._idle.items()):
+                while idle:
+                    connection = idle.pop()[0]
+                    connection.close()
+                    self._usage.pop(id(connection), None)
+                    self._open[key] -= 1
+                self._prune(key)
+            self._condition.notify_all()
+
+    def _expired(self, connection: dj.Connection) -> bool:
+        with self._condition:
+            opened, uses = self._usage[id(connection)]
+        return (self.max_uses is not None and uses >= self.max_uses) or (
+            self.max_lifetime is not None
+            and time.monotonic() - opened >= self.max_lifetime
+        )
+
+    def _evict_idle(self):
+        # Must be called while holding the condition lock
+        expired_before = time.monotonic() - self.idle_timeout
+        for key, idle in list(self._idle.items()):
+            while idle and idle[0][1] < expired_before:
+                connection = idle.popleft()[0]
+                connection.close()
+                self._usage.pop(id(connection), None)
+                self._open[key] -= 1
+                self._stats["evicted"] += 1
+            self._prune(key)
+
+    def _prune(self, key: tuple):
+        # Must be called while holding the condition lock. Forgets credentials without
+        # open connections, e.g. rotated OIDC access tokens, so that they do not pile up
+        if self._open.get(key, 0) <= 0 and not self._idle.get(key):
+            self._open.pop(key, None)
+            self._idle.pop(key, None)
+
+    def _discard(
+        self,
+        key: tuple,
+        connection: dj.Connection = None,
+        evicted: bool = False,
+        recycled: bool = False,
+    ):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        with self._condition:
+            self._open[key] -= 1
+            if connection is not None:
+                self._usage.pop(id(connection), None)
+            if evicted:
+                self._stats["evicted"] += 1
+            if recycled:
+                self._stats["recycled"] += 1
+            self._prune(key)
+            self._condition.notify_all()
@@ -0,0 +1,5 @@
+"""App serving the REST API along with the routes of the components of the spec."""
+
+from .server import app
+
+__all__ = ["app"]
@@ -1,236 +1,408 @@
+"""Routes of the components of the SciViz spec."""
+
 from pathlib import Path
+import hashlib
 import os
-from envyaml import EnvYAML
-import pkg_resources
-import json
 import re
-import warnings
-from pharus.component_interface import TableComponent, InsertComponent, FetchComponent
-
-
-def populate_api():
-    header_template = """# Auto-generated rest api
-from .server import app, protected_route
-from .interface import _DJConnector
-from flask import request
-import datajoint as dj
-from json import loads
-from base64 import b64decode
-from datetime import datetime
-import inspect
+import sys
+import threading
+import time
 import traceback
-import os
-try:
-    from .component_interface_override import type_map
-except (ModuleNotFoundError, ImportError):
-    from .component_interface import type_map
-"""
-    route_template = """
+import types
+import warnings
+from functools import partial
+from envyaml import EnvYAML
+from flask import Flask, current_app, request
+from pharus.component_interface import (
+    TableComponent,
+    InsertComponent,
+    FetchComponent,
+    compile_spec,
+)
+from pharus.interface import _result_cache
 
-@app.route('{route}', methods={rest_verb})
-@protected_route
-def {method_name}(connection: dj.Connection) -> dict:
+# Component types served by a route
+ROUTED_TYPES = re.compile(
+    r"""^(
+        table|
+        antd-table|
+        metadata|
+        plot|
+        file|
+        slider|
+        dropdown-query|
+        form|
+        basicquery|
+        external|
+        slideshow|
+        delete
+        ).*$""",
+    flags=re.VERBOSE,
+)
 
-    if request.method in {rest_verb}:
-        try:
-            component_instance = type_map['{component_type}'](name='{component_name}',
-                                                              component_config={component},
-                                                              static_config={static_config},
-                                                              connection=connection,
-                                                              {payload})
-            return component_instance.{method_name_type}()
-        except Exception as e:
-            return traceback.format_exc(), 500
-"""
-    route_template_nologin = """
-
-@app.route('{route}', methods={rest_verb})
-def {method_name}() -> dict:
-    if request.method in {rest_verb}:
-        connection = dj.Connection(
-            host=os.environ["PHARUS_HOST"],
-            user=os.environ["PHARUS_USER"],
-            password=os.environ["PHARUS_PASSWORD"],
-        )
-        try:
-            component_instance = type_map['{component_type}'](name='{component_name}',
-                                                              component_config={component},
-                                                              static_config={static_config},
-                                                              connection=connection,
-                                                              {payload})
-            return component_instance.{method_name_type}()
-        except Exception as e:
-            return traceback.format_exc(), 500
-"""
-
-    pharus_root = f"{pkg_resources.get_distribution('pharus').module_path}/pharus"
-    api_path = f"{pharus_root}/dynamic_api.py"
-    spec_path = os.environ.get("PHARUS_SPEC_PATH")
-    values_yaml = EnvYAML(Path(spec_path))
-    with open(Path(api_path), "w") as f:
-        f.write(header_template)
-        active_route_template = (
-            route_template if values_yaml["SciViz"]["auth"] else route_template_nologin
-        )
-        if (
-            "component_interface" in values_yaml["SciViz"]
-            and "override" in values_yaml["SciViz"]["component_interface"]
-        ):
-            with open(
-                Path(pharus_root, "component_interface_override.py"), "w"
-            ) as component_interface_override:
-                component_interface_override.write(
-                    values_yaml["SciViz"]["component_interface"]["override"]
-                )
-        type_map_str = ""
+
+def load_type_map(sciviz: dict) -> dict:
+    """
+    Get the component classes of each component type, which the spec may override with
+    Python code defining its own ``type_map``. The override is loaded in memory as the
+    ``pharus.component_interface_override`` module.
+
+    Args:
+        sciviz: ``SciViz`` section of the spec.
+
+    Returns:
+        Mapping of component types to component classes.
+    """
+
+    if "override" in sciviz.get("component_interface", {}):
+        module = types.ModuleType("pharus.component_interface_override")
+        module.__package__ = "pharus"
+        sys.modules[module.__name__] = module
         try:
-            type_map_str = "USING OVERRIDE TYPE_MAP"
-            from .component_interface_override import type_map
-        except (ModuleNotFoundError, ImportError):
-            type_map_str = "USING STANDARD TYPE_MAP"
-            from .component_interface import type_map
-        except Exception as e:
-            raise e
-        print(type_map_str, flush=True)
-        static_config = (
-            json.dumps(values_yaml["SciViz"]["component_interface"]["static_variables"])
-            if (
-                "component_interface" in values_yaml["SciViz"]
-                and "static_variables" in values_yaml["SciViz"]["component_interface"]
+            exec(
+                compile(
+                    sciviz["component_interface"]["override"],
+                    "<spec component_interface override>",
+                    "exec",
+                ),
+                vars(module),
             )
-            else None
+            print("USING OVERRIDE TYPE_MAP", flush=True)
+            return module.type_map
+        except (ModuleNotFoundError, ImportError, AttributeError):
+            del sys.modules[module.__name__]
+    from .component_interface import type_map
+
+    print("USING STANDARD TYPE_MAP", flush=True)
+    return type_map
+
+
+def spec_routes(sciviz: dict, type_map: dict) -> list:
+    """
+    Crawl the pages of the spec for the routes of its components.
+
+    Args:
+        sciviz: ``SciViz`` section of the spec.
+        type_map: Mapping of component types to component classes.
+
+    Returns:
+        A list of routes as dictionaries with the ``route``, its ``methods``, the
+            ``endpoint`` name, a ``component`` factory taking the connection and payload
+            of a request, the ``method_name`` of the component responding, and whether
+            the request's JSON body is the component's ``payload``.
+    """
+
+    static_config = sciviz.get("component_interface", {}).get("static_variables")
+
+    def route(route, methods, component_type, name, config, method_name, payload=False):
+        # Compile the component's code once rather than on every request
+        compile_spec(config)
+        return dict(
+            route=route,
+            methods=methods,
+            endpoint=route.replace("/", ""),
+            component=partial(
+                type_map[component_type],
+                name=name,
+                component_config=config,
+                static_config=static_config,
+            ),
+            method_name=method_name,
+            payload=payload,
         )
-        pages = values_yaml["SciViz"]["pages"]
-        # Crawl through the yaml file for the routes in the components
-        for page in pages.values():
-            for grid in page["grids"].values():
-                if grid["type"] == "dynamic":
-                    f.write(
-                        (active_route_template).format(
-                            route=grid["route"],
-                            rest_verb=[FetchComponent.rest_verb[0]],
-                            method_name=grid["route"].replace("/", ""),
-                            component_type="basicquery",
-                            component_name="dynamicgrid",
-                            component=json.dumps(grid),
-                            static_config=static_config,
-                            payload="",
-                            method_name_type="dj_query_route",
-                        )
+
+    routes = []
+    for page in sciviz["pages"].values():
+        for grid in page["grids"].values():
+            if grid["type"] == "dynamic":
+                routes.append(
+                    route(
+                        grid["route"],
+                        [FetchComponent.rest_verb[0]],
+                        "basicquery",
+                        "dynamicgrid",
+                        grid,
+                        "dj_query_route",
                     )
-                for comp_name, comp in (
-                    grid["component_templates"]
-                    if "component_templates" in grid
-                    else grid["components"]
-                ).items():
-                    if re.match(r"^table.*$", comp["type"]):
-                        # For some reason the warnings package filters out deprecation
-                        # warnings by default so make sure that filter is turned off
-                        warnings.simplefilter("always", DeprecationWarning)
-                        warnings.warn(
-                            "table component to be Deprecated in next major release, "
-                            + "please use antd-table",
-                            DeprecationWarning,
-                            stacklevel=2,
-                        )
-                    if re.match(
-                        r"""^(
-                            table|
-                            antd-table|
-                            metadata|
-                            plot|
-                            file|
-                            slider|
-                            dropdown-query|
-                            form|
-                            basicquery|
-                            external|
-                            slideshow|
-                            delete
-                            ).*$""",
+                )
+            for comp_name, comp in (
+                grid["component_templates"]
+                if "component_templates" in grid
+                else grid["components"]
+            ).items():
+                if re.match(r"^table.*$", comp["type"]):
+                    # For some reason the warnings package filters out deprecation
+                    # warnings by default so make sure that filter is turned off
+                    warnings.simplefilter("always", DeprecationWarning)
+                    warnings.warn(
+                        "table component to be Deprecated in next major release, "
+                        + "please use antd-table",
+                        DeprecationWarning,
+                        stacklevel=2,
+                    )
+                if not ROUTED_TYPES.match(comp["type"]):
+                    continue
+                component_class = type_map[comp["type"]]
+                routes.append(
+                    route(
+                        comp["route"],
+                        [component_class.rest_verb[0]],
                         comp["type"],
-                        flags=re.VERBOSE,
+                        comp_name,
+                        comp,
+                        "dj_query_route",
+                        payload=comp["type"].split(":", 1)[0] == "form",
+                    )
+                )
+                if issubclass(component_class, InsertComponent):
+                    for route_format, method_name in (
+                        (component_class.fields_route_format, "fields_route"),
+                        (component_class.presets_route_format, "presets_route"),
                     ):
-                        f.write(
-                            (active_route_template).format(
-                                route=comp["route"],
-                                rest_verb=[type_map[comp["type"]].rest_verb[0]],
-                                method_name=comp["route"].replace("/", ""),
-                                component_type=comp["type"],
-                                component_name=comp_name,
-                                component=json.dumps(comp),
-                                static_config=static_config,
-                                payload=(
-                                    "payload=request.get_json()"
-                                    if comp["type"].split(":", 1)[0] == "form"
-                                    else ""
-                                ),
-                                method_name_type="dj_query_route",
+                        routes.append(
+                            route(
+                                route_format.format(route=comp["route"]),
+                                [InsertComponent.rest_verb[1]],
+                                comp["type"],
+                                comp_name,
+                                comp,
+                                method_name,
                             )
                         )
-                        if issubclass(type_map[comp["type"]], InsertComponent):
-                            fields_route = type_map[
-                                comp["type"]
-                            ].fields_route_format.format(route=comp["route"])
-                            presets_route = type_map[
-                                comp["type"]
-                            ].presets_route_format.format(route=comp["route"])
-                            f.write(
-                                (active_route_template).format(
-                                    route=fields_route,
-                                    rest_verb=[InsertComponent.rest_verb[1]],
-                                    method_name=fields_route.replace("/", ""),
-                                    component_type=comp["type"],
-                                    component_name=comp_name,
-                                    component=json.dumps(comp),
-                                    static_config=static_config,
-                                    payload="payload=None",
-                                    method_name_type="fields_route",
-                                )
-                            )
-                            f.write(
-                                (active_route_template).format(
-                                    route=presets_route,
-                                    rest_verb=[InsertComponent.rest_verb[1]],
-                                    method_name=presets_route.replace("/", ""),
-                                    component_type=comp["type"],
-                                    component_name=comp_name,
-                                    component=json.dumps(comp),
-                                    static_config=static_config,
-                                    payload="payload=None",
-                                    method_name_type="presets_route",
-                                )
-                            )
-                        elif issubclass(type_map[comp["type"]], TableComponent):
-                            attributes_route = type_map[
-                                comp["type"]
-                            ].attributes_route_format.format(route=comp["route"])
-                            uniques_route = type_map[
-                                comp["type"]
-                            ].uniques_route_format.format(route=comp["route"])
-                            f.write(
-                                (active_route_template).format(
-                                    route=attributes_route,
-                                    rest_verb=[TableComponent.rest_verb[0]],
-                                    method_name=attributes_route.replace("/", ""),
-                                    component_type=comp["type"],
-                                    component_name=comp_name,
-                                    component=json.dumps(comp),
-                                    static_config=static_config,
-                                    payload="",
-                                    method_name_type="attributes_route",
-                                )
-                            )
-                            f.write(
-                                (active_route_template).format(
-                                    route=uniques_route,
-                                    rest_verb=[TableComponent.rest_verb[0]],
-                                    method_name=uniques_route.replace("/", ""),
-                                    component_type=comp["type"],
-                                    component_name=comp_name,
-                                    component=json.dumps(comp),
-                                    static_config=static_config,
-                                    payload="",
-                                    method_name_type="uniques_route",
-                                )
+                elif issubclass(component_class, TableComponent):
+                    for route_format, method_name in (
+                        (component_class.attributes_route_format, "attributes_route"),
+                        (component_class.uniques_route_format, "uniques_route"),
+                    ):
+                        routes.append(
+                            route(
+                                route_format.format(route=comp["route"]),
+                                [TableComponent.rest_verb[0]],
+                                comp["type"],
+                                comp_name,
+                                comp,
+                                method_name,
                             )
+                        )
+    return routes
+
+
+def load_spec(spec_path: str = None) -> tuple:
+    """
+    Parse and validate the spec, compiling the code of its components.
+
+    Args:
+        spec_path (optional): Path of the spec, defaults to ``PHARUS_SPEC_PATH``.
+
+    Returns:
+        The ``SciViz`` section of the spec and its routes by endpoint, as returned by
+            :func:`spec_routes`.
+    """
+
+    sciviz = EnvYAML(Path(spec_path or os.environ.get("PHARUS_SPEC_PATH")))["SciViz"]
+    routes = {}
+    for route in spec_routes(sciviz, load_type_map(sciviz)):
+        routes.setdefault(route["endpoint"], route)
+    return sciviz, routes
+
+
+def component_view(endpoint: str):
+    """
+    View function of a component route, instantiating the component of the route
+    currently registered under ``endpoint`` on the request's connection.
+
+    Args:
+        endpoint: Endpoint of the route, see :func:`spec_routes`.
+
+    Returns:
+        View function taking the connection of the request.
+    """
+
+    def view(connection):
+        route = current_app.extensions["pharus_spec"]["routes"].get(endpoint)
+        if route is None:
+            # Removed by a reload of the spec since the request was routed
+            return f"{request.path} not found", 404
+        if request.method in route["methods"]:
+            try:
+                component_instance = route["component"](
+                    connection=connection,
+                    payload=request.get_json() if route["payload"] else None,
+                )
+                return component_instance.respond(route["method_name"])
+            except Exception:
+                return traceback.format_exc(), 500
+
+    view.__name__ = endpoint
+    return view
+
+
+def _changed_components(previous: dict, sciviz: dict, routes: dict) -> set:
+    # Routes of the components whose configuration differs between two specs
+    def component(route):
+        return (
+            route["component"].func.__qualname__,
+            route["component"].keywords,
+        )
+
+    override_changed = previous["sciviz"].get("component_interface") != sciviz.get(
+        "component_interface"
+    )
+    return {
+        route["component"].keywords["component_config"]["route"]
+        for endpoint, route in previous["routes"].items()
+        if override_changed
+        or endpoint not in routes
+        or component(route) != component(routes[endpoint])
+    }
+
+
+def _swap_url_map(app: Flask, removed: set, routes: dict):
+    # Flask does not allow adding rules once serving so the URL map is replaced whole
+    url_map = app.url_map
+    rules = []
+    for rule in url_map.iter_rules():
+        if rule.endpoint not in removed:
+            clone = rule.empty()
+            clone.provide_automatic_options = getattr(
+                rule, "provide_automatic_options", False
+            )
+            rules.append(clone)
+    for endpoint, route in routes.items():
+        rule = app.url_rule_class(
+            route["route"], endpoint=endpoint, methods={*route["methods"], "OPTIONS"}
+        )
+        rule.provide_automatic_options = True
+        rules.append(rule)
+    app.url_map = app.url_map_class(
+        rules,
+        default_subdomain=url_map.default_subdomain,
+        strict_slashes=url_map.strict_slashes,
+        merge_slashes=url_map.merge_slashes,
+        redirect_defaults=url_map.redirect_defaults,
+        converters=url_map.converters,
+        sort_parameters=url_map.sort_parameters,
+        sort_key=url_map.sort_key,
+        host_matching=url_map.host_matching,
+    )
+
+
+def _install(app: Flask, sciviz: dict, routes: dict, digest: str):
+    # Swap the routes of the spec served by the app for new ones
+    from .server import protected_route, service_route
+
+    previous = app.extensions.get("pharus_spec", dict(routes={}, sciviz={}))
+    # The app's own routes take precedence over the spec
+    routes = {
+        endpoint: route
+        for endpoint, route in routes.items()
+        if endpoint in previous["routes"] or endpoint not in app.view_functions
+    }
+    route_decorator = protected_route if sciviz["auth"] else service_route
+    for endpoint in routes:
+        app.view_functions[endpoint] = route_decorator(component_view(endpoint))
+    changed = _changed_components(previous, sciviz, routes)
+    app.extensions["pharus_spec"] = dict(routes=routes, sciviz=sciviz, digest=digest)
+    _swap_url_map(app, set(previous["routes"]), routes)
+    for endpoint in set(previous["routes"]) - set(routes):
+        del app.view_functions[endpoint]
+    # Responses of unchanged components remain valid
+    if changed:
+        _result_cache.discard(lambda key: key[0] in changed)
+
+
+def _digest(spec_path: str) -> str:
+    return hashlib.sha256(Path(spec_path).read_bytes()).hexdigest()
+
+
+# Reloads of the spec are serialized
+_reload_lock = threading.Lock()
+
+
+def populate_api(app: Flask = None):
+    """
+    Register the routes of the components of the spec at ``PHARUS_SPEC_PATH`` on the
+    app, directly from the parsed spec.
+
+    Args:
+        app (optional): Flask app, defaults to the app of ``pharus.server``.
+    """
+
+    from .server import app as server_app
+
+    app = server_app if app is None else app
+    spec_path = os.environ.get("PHARUS_SPEC_PATH")
+    with _reload_lock:
+        digest = _digest(spec_path)
+        _install(app, *load_spec(spec_path), digest)
+
+
+def reload_api(app: Flask = None) -> bool:
+    """
+    Reload the spec at ``PHARUS_SPEC_PATH`` if it changed, without restarting the
+    server. The new spec is parsed and its components compiled before its routes are
+    atomically swapped in, so that requests are served by either spec and an invalid
+    spec leaves the current routes in place. Connection pools are kept as well as the
+    cached responses of the components whose configuration did not change.
+
+    Args:
+        app (optional): Flask app, defaults to the app of ``pharus.server``.
+
+    Returns:
+        Whether the routes were replaced.
+    """
+
+    from .server import app as server_app
+
+    app = server_app if app is None else app
+    spec_path = os.environ.get("PHARUS_SPEC_PATH")
+    with _reload_lock:
+        current = app.extensions.get("pharus_spec")
+        try:
+            digest = _digest(spec_path)
+        except OSError:
+            # The spec may be briefly missing while it is replaced
+            return False
+        if current is not None and digest == current["digest"]:
+            return False
+        try:
+            sciviz, routes = load_spec(spec_path)
+        except Exception:
+            print(f"INVALID SPEC, NOT RELOADED\n{traceback.format_exc()}", flush=True)
+            if current is not None:
+                # Wait for the spec to change again rather than failing on every poll
+                app.extensions["pharus_spec"] = dict(current, digest=digest)
+            return False
+        _install(app, sciviz, routes, digest)
+    print("SPEC RELOADED", flush=True)
+    return True
+
+
+def watch_spec(app: Flask = None, interval: float = None) -> threading.Thread:
+    """
+    Reload the spec whenever it changes, see :func:`reload_api`, polling it in a
+    background thread.
+
+    Args:
+        app (optional): Flask app, defaults to the app of ``pharus.server``.
+        interval (optional): Seconds between polls, defaults to
+            ``PHARUS_SPEC_RELOAD_INTERVAL``.
+
+    Returns:
+        The polling thread.
+    """
+
+    if interval is None:
+        interval = float(os.environ.get("PHARUS_SPEC_RELOAD_INTERVAL", 5))
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_api(app)
+            except Exception:
+                traceback.print_exc()
+
+    thread = threading.Thread(target=watch, name="pharus-spec-watcher", daemon=True)
+    thread.start()
+    return thread
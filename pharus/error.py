@@ -23,3 +23,9 @@ class TableNotFound(Exception):
     """Exception raised when a given table is not found to exist"""
 
     pass
+
+
+class ConnectionPoolExhausted(Exception):
+    """Exception raised when no pooled connection becomes available in time"""
+
+    pass
@@ -1,6 +1,7 @@
 """Library for interfaces into DataJoint pipelines."""
 
 import datajoint as dj
+import copy
 import math
 from numbers import Number
 from datajoint import DataJointError
@@ -8,8 +9,24 @@ from datajoint.utils import to_camel_case
 from datajoint.user_tables import UserTable
 from datajoint import VirtualModule
 import datetime
-import numpy as np
+import decimal
+import hashlib
+import json
 import re
+import uuid
+import numpy as np
+import threading
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from os import environ
+from tempfile import SpooledTemporaryFile
+from pymysql.converters import escape_item
+from pymysql.cursors import SSDictCursor
+from datajoint.fetch import _get
+from functools import lru_cache
+from .cache import ResultCache, SingleFlight, TTLCache
+from .connection_pool import ConnectionPool
 from .error import (
     InvalidRestriction,
     UnsupportedTableType,
@@ -19,6 +36,70 @@ from .error import (
 
 DAY = 24 * 60 * 60
 DEFAULT_FETCH_LIMIT = 1000  # Stop gap measure to deal with super large tables
+_virtual_modules_lock = threading.Lock()
+EPOCH_DATE = datetime.date(1970, 1, 1)
+COUNT_POLICIES = ("exact", "none", "estimate", "cached")
+# Record counts keyed by database host and query SQL for the `cached` count policy
+_count_cache = TTLCache(
+    max_entries=int(environ.get("PHARUS_COUNT_CACHE_SIZE", 1024)),
+    ttl=float(environ.get("PHARUS_COUNT_CACHE_TTL", 60)),
+)
+# Serialized responses of component routes, invalidated by writes made through pharus
+_result_cache = ResultCache(
+    max_bytes=int(environ.get("PHARUS_RESULT_CACHE_BYTES", 64 * 1024 * 1024)),
+    max_refreshes=int(environ.get("PHARUS_RESULT_CACHE_REFRESH_WORKERS", 2)),
+)
+# Concurrent identical component requests sharing a single execution
+_single_flight = SingleFlight()
+# Threads counting records on a sibling connection while a page is fetched, if enabled
+_count_executor = (
+    ThreadPoolExecutor(
+        max_workers=int(environ["PHARUS_COUNT_WORKERS"]),
+        thread_name_prefix="pharus-count",
+    )
+    if int(environ.get("PHARUS_COUNT_WORKERS", 0))
+    else None
+)
+
+
+def _keep_value(value):
+    return value
+
+
+def _blob_placeholder(value):
+    return "=BLOB="
+
+
+def _date_to_epoch(value):
+    # Date attribute type covert to epoch time
+    return None if value is None else (value - EPOCH_DATE).days * DAY
+
+
+def _time_to_seconds(value):
+    # Time attribute, return total seconds
+    return None if value is None else value.total_seconds()
+
+
+def _datetime_to_epoch(value):
+    # Datetime or timestamp, use timestamp to covert to epoch time
+    return (
+        None
+        if value is None
+        else value.replace(tzinfo=datetime.timezone.utc).timestamp()
+    )
+
+
+def _decimal_to_str(value):
+    return None if value is None else str(value)
+
+
+def _plain_value(value):
+    # Normal attribute, use .item to deal with numpy types
+    if isinstance(value, np.generic):
+        value = value.item()
+        if isinstance(value, Number) and math.isnan(value):
+            return str(value)
+    return value
 
 
 class _DJConnector:
@@ -51,6 +132,136 @@ class _DJConnector:
             )
         ]
 
+    @staticmethod
+    def _get_virtual_module(
+        connection: dj.Connection, schema_name: str, module_name: str = None
+    ) -> VirtualModule:
+        """
+        Get a virtual module for a schema, reusing the one previously spawned on the same
+        connection as long as none of the schema's tables were created, altered, dropped
+        or updated since.
+
+        Args:
+            connection: User's DataJoint connection object.
+            schema_name: Name of the schema.
+            module_name (optional): Displayed module name, defaults to ``schema_name``.
+
+        Returns:
+            Virtual module with a class for each table of the schema.
+        """
+
+        _DJConnector._fresh_statistics(connection)
+        fingerprint = connection.query(
+            """
+            SELECT COUNT(*), SUM(CRC32(CONCAT_WS(',', TABLE_NAME, CREATE_TIME, UPDATE_TIME)))
+            FROM information_schema.tables WHERE TABLE_SCHEMA = %s
+            """,
+            args=(schema_name,),
+        ).fetchone()
+        # Stored on the connection, like DataJoint's own schema registry, so that cached
+        # modules never outlive the connection they are bound to
+        with _virtual_modules_lock:
+            virtual_modules = vars(connection).setdefault("_pharus_virtual_modules", {})
+            cached = virtual_modules.get(schema_name)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        if cached is not None:
+            connection.dependencies.load(force=True)
+        virtual_module = dj.VirtualModule(
+            module_name or schema_name, schema_name, connection=connection
+        )
+        with _virtual_modules_lock:
+            virtual_modules[schema_name] = (fingerprint, virtual_module)
+        return virtual_module
+
+    @staticmethod
+    def _fresh_statistics(connection: dj.Connection):
+        """
+        Make ``information_schema.TABLES`` report current table statistics on a
+        connection. MySQL 8 otherwise serves ``UPDATE_TIME`` and ``TABLE_ROWS`` from a
+        cache refreshed daily. Has no effect on servers without such a cache.
+
+        Args:
+            connection: User's DataJoint connection object.
+        """
+
+        if vars(connection).get("_pharus_fresh_statistics"):
+            return
+        try:
+            connection.query("SET SESSION information_schema_stats_expiry = 0")
+        except Exception:
+            pass
+        vars(connection)["_pharus_fresh_statistics"] = True
+
+    @staticmethod
+    def _table_names(query) -> set:
+        """
+        Get the base tables a query reads from.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+
+        Returns:
+            Full table names, e.g. ``{"`schema`.`table`"}``.
+        """
+
+        table_names, expressions = set(), [query]
+        while expressions:
+            for support in expressions.pop().support:
+                if isinstance(support, str):
+                    table_names.add(support)
+                else:
+                    expressions.append(support)
+        return table_names
+
+    @staticmethod
+    def _table_states(query) -> list:
+        """
+        Get the modification state of every base table a query reads from.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+
+        Returns:
+            Sorted ``(schema, table, CREATE_TIME, UPDATE_TIME, TABLE_ROWS)`` tuples.
+        """
+
+        table_names = [
+            re.match(r"^`(.+)`\.`(.+)`$", table_name).groups()
+            for table_name in _DJConnector._table_names(query)
+        ]
+        if not table_names:
+            return []
+        _DJConnector._fresh_statistics(query.connection)
+        return sorted(
+            query.connection.query(
+                f"""
+                SELECT TABLE_SCHEMA, TABLE_NAME, CREATE_TIME, UPDATE_TIME, TABLE_ROWS
+                FROM information_schema.TABLES WHERE (TABLE_SCHEMA, TABLE_NAME) IN
+                ({", ".join(["(%s, %s)"] * len(table_names))})
+                """,
+                args=[name for table_name in table_names for name in table_name],
+            ).fetchall()
+        )
+
+    @staticmethod
+    def _etag(query, *key) -> str:
+        """
+        Entity tag of a response derived from a query, which changes whenever the query
+        or any of the tables it reads from changes.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            key: Anything else the response depends on, e.g. request arguments.
+
+        Returns:
+            Hex digest of the query's SQL, ``key`` and the state of its tables.
+        """
+
+        return hashlib.sha256(
+            repr((query.make_sql(), key, _DJConnector._table_states(query))).encode()
+        ).hexdigest()
+
     @staticmethod
     def _list_tables(
         connection: dj.Connection,
@@ -110,6 +321,8 @@ class _DJConnector:
         order=None,
         fetch_blobs=False,
         fetch_args=[],
+        cursor: str = None,
+        count: str = "exact",
     ) -> tuple:
         """
         Get records from the query.
@@ -122,19 +335,770 @@ class _DJConnector:
             page (optional): Page number to return, defaults to ``1``.
             order (optional): Sequence to order records, defaults to ``['KEY ASC']``. See
                 :class:`~datajoint.fetch.Fetch` for more info.
+            cursor (optional): Opaque cursor returned by a previous call to seek to the
+                next page instead of skipping ``(page - 1) * limit`` records. Pass ``""``
+                to request the first page in cursor mode, defaults to ``None`` (offset
+                paging).
+            count (optional): How the total number of records is computed, one of
+                ``exact``, ``none``, ``estimate`` or ``cached``. See :meth:`_count`,
+                defaults to ``exact``.
 
         Returns:
             A tuple containing:
 
                 - Attribute headers
                 - Records in dictionary form
-                - The total number of records that can be paged
+                - The total number of records that can be paged, ``None`` if not counted
+                - The cursor of the next page or ``None`` on the last page, only included
+                  when ``cursor`` is set
         """
 
-        # Get table object from name
-        attributes = query.heading.attributes
+        query_restricted, attributes, fetch_args, order_by, limit = (
+            _DJConnector._prepare_fetch(
+                query, restriction, limit, order, fetch_blobs, fetch_args
+            )
+        )
+        query_page, order_by, keyset = _DJConnector._seek(
+            query_restricted, order_by, cursor
+        )
         # Fetch tuples without blobs as dict to be used to create a
         #   list of tuples for returning
+        non_blobs_rows, total_count = _DJConnector._fetch_and_count(
+            lambda: query_page.fetch(
+                *fetch_args,
+                *[k for k, _ in keyset if k not in fetch_args],
+                as_dict=True,
+                limit=limit,
+                offset=0 if cursor is not None else (page - 1) * limit,
+                order_by=order_by,
+            ),
+            query_restricted,
+            count,
+        )
+        rows = _DJConnector._convert_records(attributes, non_blobs_rows, fetch_blobs)
+        if cursor is None:
+            return list(attributes.keys()), rows, total_count
+        return (
+            list(attributes.keys()),
+            rows,
+            total_count,
+            _DJConnector._next_cursor(
+                keyset, non_blobs_rows[-1] if len(non_blobs_rows) == limit else None
+            ),
+        )
+
+    @staticmethod
+    def _fetch_columns(
+        query,
+        restriction: list = [],
+        limit: int = 1000,
+        page: int = 1,
+        order=None,
+        fetch_blobs=False,
+        fetch_args=[],
+        cursor: str = None,
+        count: str = "exact",
+    ) -> tuple:
+        """
+        Get records from the query in column-major form. Same as
+        :meth:`_fetch_records` except that each attribute is fetched as a NumPy array and
+        converted with vectorized operations. ``NaN`` values are returned as ``None``.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            restriction (optional): Sequence of filters as ``dict`` with ``attributeName``,
+                ``operation``, ``value`` keys defined, defaults to ``[]``.
+            limit (optional): Max number of records to return, defaults to ``1000``.
+            page (optional): Page number to return, defaults to ``1``.
+            order (optional): Sequence to order records, defaults to ``['KEY ASC']``. See
+                :class:`~datajoint.fetch.Fetch` for more info.
+            cursor (optional): Opaque cursor returned by a previous call, see
+                :meth:`_fetch_records`, defaults to ``None`` (offset paging).
+            count (optional): How the total number of records is computed, see
+                :meth:`_count`, defaults to ``exact``.
+
+        Returns:
+            A tuple containing:
+
+                - Attribute headers
+                - Records as a dictionary of attribute name to list of values
+                - The total number of records that can be paged, ``None`` if not counted
+                - The cursor of the next page or ``None`` on the last page, only included
+                  when ``cursor`` is set
+        """
+
+        query_restricted, attributes, fetch_args, order_by, limit = (
+            _DJConnector._prepare_fetch(
+                query, restriction, limit, order, fetch_blobs, fetch_args
+            )
+        )
+        query_page, order_by, keyset = _DJConnector._seek(
+            query_restricted, order_by, cursor
+        )
+        fetch_args += [k for k, _ in keyset if k not in fetch_args]
+        arrays, total_count = _DJConnector._fetch_and_count(
+            lambda: query_page.fetch(
+                *fetch_args,
+                limit=limit,
+                offset=0 if cursor is not None else (page - 1) * limit,
+                order_by=order_by,
+            ),
+            query_restricted,
+            count,
+        )
+        arrays = dict(zip(fetch_args, [arrays] if len(fetch_args) == 1 else arrays))
+        record_count = len(arrays[fetch_args[0]]) if fetch_args else 0
+        columns = {
+            attribute_name: (
+                _DJConnector._convert_column(
+                    attribute_info, arrays[attribute_name], fetch_blobs
+                )
+                if attribute_name in arrays
+                # Blobs are not fetched unless requested
+                else ["=BLOB="] * record_count
+            )
+            for attribute_name, attribute_info in attributes.items()
+        }
+        if cursor is None:
+            return list(attributes.keys()), columns, total_count
+        return (
+            list(attributes.keys()),
+            columns,
+            total_count,
+            _DJConnector._next_cursor(
+                keyset,
+                (
+                    {k: arrays[k][-1] for k, _ in keyset}
+                    if record_count == limit
+                    else None
+                ),
+            ),
+        )
+
+    @staticmethod
+    def _stream_records(
+        query,
+        restriction: list = [],
+        order=None,
+        fetch_blobs=False,
+        fetch_args=[],
+        batch_size: int = 1000,
+    ) -> tuple:
+        """
+        Get all records from the query in batches read from an unbuffered server-side
+        cursor, so that memory use does not depend on the number of records. Records are
+        converted as in :meth:`_fetch_records`. The query's connection must not be used
+        for anything else until the batches are exhausted or closed.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            restriction (optional): Sequence of filters as ``dict`` with ``attributeName``,
+                ``operation``, ``value`` keys defined, defaults to ``[]``.
+            order (optional): Sequence to order records, defaults to ``['KEY ASC']``. See
+                :class:`~datajoint.fetch.Fetch` for more info.
+            batch_size (optional): Number of records read from the server at a time,
+                defaults to ``1000``.
+
+        Returns:
+            A tuple containing:
+
+                - Attribute headers
+                - Generator of records in dictionary form, one batch at a time
+        """
+
+        query_restricted, attributes, fetch_args, order_by, limit = (
+            _DJConnector._prepare_fetch(
+                query, restriction, None, order, fetch_blobs, fetch_args
+            )
+        )
+        sql = (query_restricted & dj.Top(limit=limit, order_by=order_by)).make_sql(
+            fetch_args
+        )
+        # Values that DataJoint decodes on fetch, e.g. UUIDs and blobs
+        decoded = {
+            k: query.heading.attributes[k]
+            for k in fetch_args
+            if query.heading.attributes[k].uuid
+            or query.heading.attributes[k].is_blob
+            or query.heading.attributes[k].is_attachment
+            or query.heading.attributes[k].is_filepath
+            or query.heading.attributes[k].json
+            or query.heading.attributes[k].adapter
+        }
+
+        def batches():
+            cursor = query.connection._conn.cursor(SSDictCursor)
+            try:
+                # Empty arguments so that `%%` escaped by DataJoint is unescaped
+                cursor.execute(sql, ())
+                while records := cursor.fetchmany(batch_size):
+                    for record in records:
+                        for attribute_name, attribute_info in decoded.items():
+                            record[attribute_name] = _get(
+                                query.connection,
+                                attribute_info,
+                                record[attribute_name],
+                                squeeze=False,
+                                download_path=".",
+                            )
+                    yield _DJConnector._convert_records(
+                        attributes, records, fetch_blobs
+                    )
+            finally:
+                cursor.close()
+
+        return list(attributes.keys()), batches()
+
+    @staticmethod
+    def _stream_arrow(
+        query,
+        restriction: list = [],
+        order=None,
+        fetch_blobs=False,
+        fetch_args=[],
+        batch_size: int = 10000,
+    ) -> tuple:
+        """
+        Get all records from the query as Apache Arrow record batches. Each batch is
+        fetched in column-major form and seeks past the previous one as described in
+        :meth:`_seek`. Requires ``pyarrow``.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            restriction (optional): Sequence of filters as ``dict`` with ``attributeName``,
+                ``operation``, ``value`` keys defined, defaults to ``[]``.
+            order (optional): Sequence of attributes to order records, defaults to
+                ``['KEY ASC']``.
+            batch_size (optional): Max number of records per batch, defaults to
+                ``10000``.
+
+        Returns:
+            A tuple containing:
+
+                - Arrow schema of the records, blobs that are not fetched are left out
+                - Generator of ``pyarrow.RecordBatch``
+        """
+
+        import pyarrow as pa
+
+        query_restricted, attributes, fetch_args, order_by, limit = (
+            _DJConnector._prepare_fetch(
+                query, restriction, None, order, fetch_blobs, fetch_args
+            )
+        )
+        attributes = {k: v for k, v in attributes.items() if k in fetch_args}
+        schema = pa.schema(
+            [
+                pa.field(attribute_name, _DJConnector._arrow_type(attribute_info))
+                for attribute_name, attribute_info in attributes.items()
+            ]
+        )
+
+        def batches():
+            cursor, remaining = "", limit
+            while cursor is not None:
+                query_page, page_order, keyset = _DJConnector._seek(
+                    query_restricted, order_by, cursor
+                )
+                page_args = fetch_args + [k for k, _ in keyset if k not in fetch_args]
+                page_limit = (
+                    batch_size if remaining is None else min(batch_size, remaining)
+                )
+                arrays = query_page.fetch(
+                    *page_args, limit=page_limit, order_by=page_order
+                )
+                arrays = dict(
+                    zip(page_args, [arrays] if len(page_args) == 1 else arrays)
+                )
+                record_count = len(arrays[page_args[0]])
+                if record_count:
+                    yield pa.RecordBatch.from_arrays(
+                        [
+                            _DJConnector._arrow_column(
+                                attribute_info, arrays[attribute_name], field.type
+                            )
+                            for (attribute_name, attribute_info), field in zip(
+                                attributes.items(), schema
+                            )
+                        ],
+                        schema=schema,
+                    )
+                remaining = None if remaining is None else remaining - record_count
+                cursor = (
+                    _DJConnector._next_cursor(
+                        keyset, {k: arrays[k][-1] for k, _ in keyset}
+                    )
+                    if record_count == page_limit and remaining != 0
+                    else None
+                )
+
+        return schema, batches()
+
+    @staticmethod
+    def _export(
+        query,
+        restriction: list = [],
+        export_format: str = "csv",
+        memory_budget: int = 64 * 1024 * 1024,
+        batch_size: int = 10000,
+        partitions: int = 1,
+    ):
+        """
+        Export all records from the query to a CSV or Parquet file. Records are walked
+        in primary key ranges of ``batch_size`` records as described in
+        :meth:`_stream_arrow`, each range being written as a CSV chunk or a Parquet row
+        group. The file is kept in memory until it exceeds ``memory_budget`` and is
+        spilled to a temporary file on disk afterwards. Requires ``pyarrow``.
+
+        With ``partitions`` greater than ``1``, the records are split in consecutive
+        ranges of the first primary key attribute, see :meth:`_partition`. The first
+        range is written by the query's connection while the others are fetched
+        concurrently on sibling connections from the same pool into temporary Arrow IPC
+        files, appended in order once the first range is written. Fewer partitions are
+        used if fewer sibling connections are available right away.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            restriction (optional): Sequence of filters as ``dict`` with ``attributeName``,
+                ``operation``, ``value`` keys defined, defaults to ``[]``.
+            export_format (optional): ``csv`` or ``parquet``, defaults to ``csv``.
+            memory_budget (optional): Max size in bytes of the file kept in memory,
+                defaults to 64 MiB.
+            batch_size (optional): Number of records per range, defaults to ``10000``.
+            partitions (optional): Max number of ranges fetched concurrently, defaults to
+                ``1``.
+
+        Returns:
+            Temporary file object positioned at its start, deleted once closed.
+        """
+
+        import pyarrow as pa
+        import pyarrow.csv
+        import pyarrow.parquet
+
+        if export_format not in ("csv", "parquet"):
+            raise ValueError(
+                f"Unsupported export format {export_format}, expected csv or parquet"
+            )
+        query_restricted = _DJConnector._prepare_fetch(
+            query, restriction, None, None, False, []
+        )[0]
+        export_file = SpooledTemporaryFile(max_size=memory_budget)
+        try:
+            with ExitStack() as stack:
+                connections = [query.connection] + [
+                    sibling
+                    for sibling in (
+                        stack.enter_context(ConnectionPool.sibling(query.connection))
+                        for _ in range(partitions - 1)
+                    )
+                    if sibling is not None
+                ]
+                ranges = _DJConnector._partition(query_restricted, len(connections))
+                schema, batches = _DJConnector._stream_arrow(
+                    ranges[0], batch_size=batch_size
+                )
+                executor = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=max(len(ranges) - 1, 1))
+                )
+                # Ranges after the first one are fetched into Arrow IPC parts meanwhile
+                parts = [
+                    executor.submit(
+                        _DJConnector._export_part,
+                        _DJConnector._rebind(query_range, connection),
+                        memory_budget // len(ranges),
+                        batch_size,
+                    )
+                    for query_range, connection in zip(ranges[1:], connections[1:])
+                ]
+                try:
+                    with (
+                        pyarrow.csv.CSVWriter(export_file, schema)
+                        if export_format == "csv"
+                        else pyarrow.parquet.ParquetWriter(export_file, schema)
+                    ) as writer:
+                        for batch in batches:
+                            writer.write_batch(batch)
+                        for part in parts:
+                            with part.result() as part_file:
+                                for batch in pa.ipc.open_stream(part_file):
+                                    writer.write_batch(batch)
+                finally:
+                    # Siblings are returned to the pool on exit, only once they are idle
+                    wait(parts)
+                    for part in parts:
+                        if part.exception() is None:
+                            part.result().close()
+        except BaseException:
+            export_file.close()
+            raise
+        export_file.seek(0)
+        return export_file
+
+    @staticmethod
+    def _export_part(query, memory_budget: int, batch_size: int):
+        """
+        Fetch all records from the query into an Arrow IPC stream file for
+        :meth:`_export`.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            memory_budget: Max size in bytes of the file kept in memory.
+            batch_size: Number of records per record batch.
+
+        Returns:
+            Temporary file object positioned at its start, deleted once closed.
+        """
+
+        import pyarrow as pa
+
+        schema, batches = _DJConnector._stream_arrow(query, batch_size=batch_size)
+        part_file = SpooledTemporaryFile(max_size=memory_budget)
+        try:
+            with pa.ipc.new_stream(part_file, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+        except BaseException:
+            part_file.close()
+            raise
+        part_file.seek(0)
+        return part_file
+
+    @staticmethod
+    def _partition(query, partitions: int) -> list:
+        """
+        Split the records of a query in consecutive ranges of its first primary key
+        attribute. Integer attributes are split evenly between their min and max values,
+        other attributes at quantiles sampled from their distinct values using the
+        estimated number of records, see :meth:`_estimate_count`.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            partitions: Max number of ranges.
+
+        Returns:
+            Queries restricted to each range, in primary key order.
+        """
+
+        if partitions < 2 or not query.primary_key:
+            return [query]
+        attribute_name = query.primary_key[0]
+        attribute_info = query.heading.attributes[attribute_name]
+        if re.match(r"^(tiny|small|medium|big)?int", attribute_info.type):
+            low, high = (
+                dj.U()
+                .aggr(
+                    query,
+                    low=f"MIN(`{attribute_name}`)",
+                    high=f"MAX(`{attribute_name}`)",
+                )
+                .fetch1("low", "high")
+            )
+            if low is None:
+                return [query]
+            boundaries = sorted(
+                {
+                    int(low) + (int(high) - int(low) + 1) * i // partitions
+                    for i in range(1, partitions)
+                }
+                - {int(low)}
+            )
+        else:
+            estimate = _DJConnector._estimate_count(query)
+            boundaries = []
+            for i in range(1, partitions):
+                boundary = (dj.U(attribute_name) & query).fetch(
+                    attribute_name,
+                    order_by=attribute_name,
+                    limit=1,
+                    offset=estimate * i // partitions,
+                )
+                if not len(boundary):
+                    break
+                if not boundaries or boundary[0] > boundaries[-1]:
+                    boundaries.append(boundary[0])
+        if not boundaries:
+            return [query]
+        literals = [
+            _DJConnector._cursor_literal(
+                attribute_info, _DJConnector._cursor_value(boundary)
+            )
+            for boundary in boundaries
+        ]
+        attribute = f"`{attribute_name}`"
+        return [
+            query
+            & " AND ".join(
+                ([f"{attribute} >= {lower}"] if lower is not None else [])
+                + ([f"{attribute} < {upper}"] if upper is not None else [])
+            )
+            for lower, upper in zip([None] + literals, literals + [None])
+        ]
+
+    @staticmethod
+    def _arrow_type(attribute_info):
+        """
+        Map a DataJoint attribute to an Apache Arrow data type.
+
+        Args:
+            attribute_info: Heading attribute.
+
+        Returns:
+            A ``pyarrow.DataType``. UUIDs, blobs and JSON are mapped to strings and enums
+                to dictionary encoded strings.
+        """
+
+        import pyarrow as pa
+
+        attribute_type = attribute_info.type
+        if (
+            attribute_info.uuid
+            or attribute_info.is_blob
+            or attribute_info.is_attachment
+            or attribute_info.is_filepath
+            or attribute_info.json
+        ):
+            return pa.string()
+        elif attribute_type.startswith("enum"):
+            return pa.dictionary(pa.int32(), pa.string())
+        elif attribute_type == "date":
+            return pa.date32()
+        elif attribute_type.startswith(("datetime", "timestamp")):
+            return pa.timestamp("us")
+        elif attribute_type == "time":
+            return pa.duration("us")
+        elif match := re.match(r"^decimal\((\d+),\s*(\d+)\)", attribute_type):
+            return pa.decimal128(int(match.group(1)), int(match.group(2)))
+        elif match := re.match(r"^(tiny|small|medium|big)?int", attribute_type):
+            bit_width = dict(tiny=8, small=16, medium=32, big=64).get(
+                match.group(1), 32
+            )
+            return getattr(
+                pa,
+                f"{'u' if 'unsigned' in attribute_type else ''}int{bit_width}",
+            )()
+        elif attribute_type.startswith("float"):
+            return pa.float32()
+        elif attribute_type.startswith("double"):
+            return pa.float64()
+        elif attribute_info.numeric:
+            return pa.from_numpy_dtype(attribute_info.dtype)
+        return pa.string()
+
+    @staticmethod
+    def _arrow_column(attribute_info, values, arrow_type):
+        """
+        Convert a fetched column into an Apache Arrow array.
+
+        Args:
+            attribute_info: Heading attribute of the column.
+            values: Column as fetched.
+            arrow_type: Type of the column, see :meth:`_arrow_type`.
+
+        Returns:
+            A ``pyarrow.Array``, ``NaN`` and ``None`` are converted to null. Blobs and
+                JSON are serialized as JSON.
+        """
+
+        import pyarrow as pa
+
+        if attribute_info.is_blob or attribute_info.json:
+            return pa.array(
+                [
+                    (
+                        None
+                        if v is None
+                        else json.dumps(
+                            v,
+                            default=lambda o: (
+                                o.tolist()
+                                if isinstance(o, (np.ndarray, np.generic))
+                                else str(o)
+                            ),
+                        )
+                    )
+                    for v in values
+                ],
+                arrow_type,
+            )
+        elif (
+            attribute_info.uuid
+            or attribute_info.is_attachment
+            or attribute_info.is_filepath
+        ):
+            return pa.array([None if v is None else str(v) for v in values], arrow_type)
+        elif pa.types.is_dictionary(arrow_type):
+            return pa.array(values, pa.string(), from_pandas=True).dictionary_encode()
+        return pa.array(values, arrow_type, from_pandas=True)
+
+    @staticmethod
+    def _fetch_and_count(fetch, query, count: str = "exact") -> tuple:
+        """
+        Fetch a page of records and count the records of a query. When
+        ``PHARUS_COUNT_WORKERS`` is set, the count runs on a worker thread using a sibling
+        connection from the same pool so that the latency is that of the slowest of the
+        two. Both run one after the other on the query's connection if no sibling
+        connection is available right away.
+
+        Args:
+            fetch: Function fetching the page on the query's connection.
+            query: Any datajoint object related to QueryExpression to count.
+            count (optional): Count policy, see :meth:`_count`, defaults to ``exact``.
+
+        Returns:
+            A tuple containing:
+
+                - The result of ``fetch``
+                - The number of records or ``None`` if not counted
+        """
+
+        if _count_executor is None or count == "none":
+            return fetch(), _DJConnector._count(query, count)
+        with ConnectionPool.sibling(query.connection) as sibling:
+            if sibling is None:
+                return fetch(), _DJConnector._count(query, count)
+            total_count = _count_executor.submit(
+                _DJConnector._count, _DJConnector._rebind(query, sibling), count
+            )
+            try:
+                records = fetch()
+            finally:
+                # The sibling is returned to the pool on exit, only once it is idle
+                wait([total_count])
+            return records, total_count.result()
+
+    @staticmethod
+    def _rebind(query, connection: dj.Connection):
+        """
+        Copy a query to run it on another connection, e.g. from another thread since
+        connections are not thread-safe.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            connection: Connection to run the copy on.
+
+        Returns:
+            Copy of the query bound to ``connection``.
+        """
+
+        query = copy.copy(query)
+        query._connection = connection
+        return query
+
+    @staticmethod
+    def _count(query, count: str = "exact") -> int:
+        """
+        Count the records of a query according to a count policy.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            count (optional): One of:
+
+                - ``exact``: ``COUNT(*)`` of the query
+                - ``none``: Skip counting
+                - ``estimate``: ``TABLE_ROWS`` statistic of an unrestricted table or the
+                  row estimates of the query plan otherwise, which are cheap but may be
+                  far off
+                - ``cached``: Exact count reused for ``PHARUS_COUNT_CACHE_TTL`` seconds
+                  (defaults to 60) among queries with the same SQL
+
+                Defaults to ``exact``.
+
+        Returns:
+            The number of records or ``None`` if not counted.
+        """
+
+        if count == "exact":
+            return len(query)
+        elif count == "none":
+            return None
+        elif count == "estimate":
+            return _DJConnector._estimate_count(query)
+        elif count == "cached":
+            # Keyed by database user too, as row-level grants may restrict what
+            # each user counts
+            key = (
+                query.connection.conn_info["host"],
+                query.connection.conn_info["user"],
+                query.make_sql(),
+            )
+            total_count = _count_cache.get(key)
+            if total_count is None:
+                total_count = len(query)
+                _count_cache.set(key, total_count)
+            return total_count
+        raise ValueError(
+            f"Unsupported count policy {count}, expected one of {COUNT_POLICIES}"
+        )
+
+    @staticmethod
+    def _estimate_count(query) -> int:
+        """
+        Estimate the number of records of a query without counting them.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+
+        Returns:
+            The estimated number of records.
+        """
+
+        if isinstance(query, dj.Table) and not query.restriction:
+            table_rows = query.connection.query(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                args=(query.database, query.table_name),
+            ).fetchone()
+            if table_rows and table_rows[0] is not None:
+                return int(table_rows[0])
+        # Rows expected out of each table of the top level join, as a fraction of the
+        #   rows examined
+        estimate = None
+        for step in query.connection.query(
+            f"EXPLAIN {query.make_sql()}", as_dict=True
+        ).fetchall():
+            if (
+                step["select_type"] in ("SIMPLE", "PRIMARY")
+                and step["rows"] is not None
+            ):
+                estimate = (
+                    (1 if estimate is None else estimate)
+                    * (
+                        step["rows"]
+                        * (100 if step["filtered"] is None else step["filtered"])
+                    )
+                    / 100
+                )
+        # No rows are examined when the optimizer knows the result is empty
+        return 0 if estimate is None else int(round(estimate))
+
+    @staticmethod
+    def _prepare_fetch(
+        query, restriction: list, limit: int, order, fetch_blobs: bool, fetch_args
+    ) -> tuple:
+        """
+        Resolve the restricted query, attributes, order and limit of a paged fetch.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            restriction: Sequence of filters as ``dict`` with ``attributeName``,
+                ``operation``, ``value`` keys defined.
+            limit: Max number of records to return unless set in ``fetch_args``.
+            order: Sequence to order records, overrides any order set in ``fetch_args``.
+            fetch_blobs: Whether blob attributes are fetched.
+            fetch_args: Attributes to fetch or ``dict`` of fetch arguments from a spec.
+
+        Returns:
+            A tuple containing:
+
+                - The restricted query
+                - The heading attributes of the records, in column order
+                - The attributes to fetch
+                - The order of the records
+                - The max number of records to return
+        """
+
+        attributes = query.heading.attributes
         query_restricted = query & dj.AndList(
             [
                 _DJConnector._filter_to_restriction(
@@ -144,6 +1108,8 @@ class _DJConnector:
             ]
         )
 
+        # Copy so that a spec's fetch arguments are left intact for later requests
+        fetch_args = dict(fetch_args) if isinstance(fetch_args, dict) else fetch_args
         order_by = (
             fetch_args.pop("order_by") if "order_by" in fetch_args else ["KEY ASC"]
         )
@@ -157,78 +1123,280 @@ class _DJConnector:
             fetch_args = query.heading.non_blobs
         else:
             attributes = {k: v for k, v in attributes.items() if k in fetch_args}
-        non_blobs_rows = query_restricted.fetch(
-            *fetch_args,
-            as_dict=True,
-            limit=limit,
-            offset=(page - 1) * limit,
-            order_by=order_by,
+        return query_restricted, attributes, list(fetch_args), order_by, limit
+
+    @staticmethod
+    def _seek(query, order_by, cursor: str = None) -> tuple:
+        """
+        Restrict a query to the records that follow a cursor.
+
+        Records are ordered by ``order_by`` followed by any primary key attribute not
+        already part of it so that the order is total and each record can be located by
+        the values of these attributes alone. The query is then restricted with a seek
+        predicate on those attributes which, unlike an ``OFFSET``, can be resolved with an
+        index range scan regardless of how deep the page is.
+
+        Args:
+            query: Any datajoint object related to QueryExpression.
+            order_by: Order of the records as attribute names optionally followed by
+                ``ASC`` or ``DESC``. ``KEY`` stands for the primary key.
+            cursor (optional): Cursor returned by :meth:`_next_cursor`, ``""`` for the
+                first page or ``None`` to leave the query as is.
+
+        Returns:
+            A tuple containing:
+
+                - The query restricted to records after the cursor
+                - The order of the records
+                - The keyset as a list of ``(attribute name, descending)``, empty when
+                  ``cursor`` is ``None``
+        """
+
+        if cursor is None:
+            return query, order_by, []
+        # attribute name -> descending, the first occurrence of an attribute decides
+        keyset = {}
+        for order in [order_by] if isinstance(order_by, str) else order_by:
+            attribute_name, *direction = order.split()
+            direction = [d.upper() for d in direction]
+            if direction not in ([], ["ASC"], ["DESC"]) or (
+                attribute_name != "KEY"
+                and attribute_name not in query.heading.attributes
+            ):
+                raise InvalidRestriction(f"Unsupported order for a cursor: {order}")
+            for k in query.primary_key if attribute_name == "KEY" else [attribute_name]:
+                keyset.setdefault(k, direction == ["DESC"])
+        for k in query.primary_key:
+            keyset.setdefault(k, False)
+        keyset = list(keyset.items())
+        order_by = [f"{k} {'DESC' if d else 'ASC'}" for k, d in keyset]
+        if not cursor:
+            return query, order_by, keyset
+
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode("utf-8")))
+            assert isinstance(values, list) and len(values) == len(keyset)
+            literals = [
+                _DJConnector._cursor_literal(query.heading.attributes[k], v)
+                for (k, _), v in zip(keyset, values)
+            ]
+        except Exception:
+            raise InvalidRestriction("Invalid cursor")
+        # Records after the cursor compare greater on the first attribute that differs,
+        #   MySQL sorts NULL before any value
+        after, equal = [], []
+        for (attribute_name, descending), literal in zip(keyset, literals):
+            attribute = f"`{attribute_name}`"
+            if literal is None:
+                after.append("FALSE" if descending else f"{attribute} IS NOT NULL")
+                equal.append(f"{attribute} IS NULL")
+            else:
+                after.append(
+                    f"({attribute} < {literal} OR {attribute} IS NULL)"
+                    if descending
+                    else f"{attribute} > {literal}"
+                )
+                equal.append(f"{attribute} = {literal}")
+        return (
+            query
+            & " OR ".join(
+                "(" + " AND ".join(equal[:i] + [after[i]]) + ")"
+                for i in range(len(keyset))
+            ),
+            order_by,
+            keyset,
         )
 
-        # Buffer list to be return
-        rows = []
-
-        # Looped through each tuple and deal with TEMPORAL types and replacing
-        #   blobs with ==BLOB== for json encoding
-        for non_blobs_row in non_blobs_rows:
-            # Buffer object to store the attributes
-            row = []
-            # Loop through each attributes, append to the tuple_to_return with specific
-            #   modification based on data type
-            for attribute_name, attribute_info in attributes.items():
-                if not (
-                    attribute_info.is_blob
-                    or attribute_info.is_attachment
-                    or attribute_info.is_filepath
-                    or attribute_info.json
-                ):
-                    if non_blobs_row[attribute_name] is None:
-                        # If it is none then just append None
-                        row.append(None)
-                    elif attribute_info.type == "date":
-                        # Date attribute type covert to epoch time
-                        row.append(
-                            (
-                                non_blobs_row[attribute_name]
-                                - datetime.date(1970, 1, 1)
-                            ).days
-                            * DAY
-                        )
-                    elif attribute_info.type == "time":
-                        # Time attirbute, return total seconds
-                        row.append(non_blobs_row[attribute_name].total_seconds())
-                    elif re.match(r"^datetime.*$", attribute_info.type) or re.match(
-                        r"timestamp", attribute_info.type
-                    ):
-                        # Datetime or timestamp, use timestamp to covert to epoch time
-                        row.append(
-                            non_blobs_row[attribute_name]
-                            .replace(tzinfo=datetime.timezone.utc)
-                            .timestamp()
-                        )
-                    elif attribute_info.type[0:7] == "decimal":
-                        # Covert decimal to string
-                        row.append(str(non_blobs_row[attribute_name]))
-                    # Normal attribute, just return value with .item to deal with numpy
-                    # types
-                    elif isinstance(non_blobs_row[attribute_name], np.generic):
-                        val = non_blobs_row[attribute_name].item()
-                        if isinstance(val, Number) and math.isnan(val):
-                            row.append(str(val))
-                        else:
-                            row.append(val)
-                    else:
-                        row.append(non_blobs_row[attribute_name])
-                else:
-                    # Attribute is blob type thus fill it in string instead
-                    (
-                        row.append(non_blobs_row[attribute_name])
-                        if fetch_blobs
-                        else row.append("=BLOB=")
-                    )
-            # Add the row list to tuples
-            rows.append(row)
-        return list(attributes.keys()), rows, len(query_restricted)
+    @staticmethod
+    def _cursor_literal(attribute_info, value) -> str:
+        """
+        Convert a value decoded from a cursor into an escaped SQL literal.
+
+        Args:
+            attribute_info: Heading attribute the value belongs to.
+            value: JSON value as encoded by :meth:`_next_cursor`.
+
+        Returns:
+            The SQL literal or ``None`` for ``NULL``.
+        """
+
+        if value is None:
+            return None
+        if not isinstance(value, (str, int, float)):
+            raise ValueError(f"Unsupported cursor value: {value}")
+        if attribute_info.uuid:
+            value = uuid.UUID(value).bytes
+        elif attribute_info.type == "date":
+            value = datetime.date.fromisoformat(value)
+        elif attribute_info.type.startswith(("datetime", "timestamp")):
+            value = datetime.datetime.fromisoformat(value)
+        elif attribute_info.type == "time":
+            value = datetime.timedelta(seconds=value)
+        elif attribute_info.type.startswith("decimal"):
+            value = decimal.Decimal(value)
+        return escape_item(value, "utf8")
+
+    @staticmethod
+    def _next_cursor(keyset: list, record: dict) -> str:
+        """
+        Encode the position of the last record of a page as an opaque cursor.
+
+        Args:
+            keyset: Keyset returned by :meth:`_seek`.
+            record: Last record of the page as fetched, or ``None`` if the page was not
+                full.
+
+        Returns:
+            A URL-safe cursor or ``None`` if there are no more records.
+        """
+
+        if record is None:
+            return None
+        values = [_DJConnector._cursor_value(record[k]) for k, _ in keyset]
+        return urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("utf-8")
+
+    @staticmethod
+    def _cursor_value(value):
+        """
+        Convert a fetched value into a JSON value that :meth:`_cursor_literal` accepts.
+
+        Args:
+            value: Value as fetched.
+
+        Returns:
+            JSON-serializable value.
+        """
+
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        elif isinstance(value, datetime.timedelta):
+            return value.total_seconds()
+        elif isinstance(value, (decimal.Decimal, uuid.UUID)):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _convert_column(attribute_info, values, fetch_blobs=False) -> list:
+        """
+        Convert a fetched column into JSON-friendly values using vectorized operations.
+        Follows the same conventions as :meth:`_convert_records`.
+
+        Args:
+            attribute_info: Heading attribute of the column.
+            values: NumPy array of fetched values.
+            fetch_blobs (optional): Whether blob values are kept, defaults to ``False``.
+
+        Returns:
+            Column values as a list.
+        """
+
+        if (
+            attribute_info.is_blob
+            or attribute_info.is_attachment
+            or attribute_info.is_filepath
+            or attribute_info.json
+        ):
+            return list(values) if fetch_blobs else ["=BLOB="] * len(values)
+        if values.dtype.kind == "f":
+            converted = values.astype(object)
+            converted[np.isnan(values)] = None
+            return converted.tolist()
+        if values.dtype.kind != "O":
+            return values.tolist()
+        missing = np.equal(values, None)
+        if attribute_info.type == "date":
+            epochs = values.astype("datetime64[D]").astype("int64") * DAY
+        elif attribute_info.type == "time":
+            epochs = values.astype("timedelta64[us]").astype("int64") / 1e6
+        elif attribute_info.type.startswith(("datetime", "timestamp")):
+            epochs = values.astype("datetime64[us]").astype("int64") / 1e6
+        elif attribute_info.type[0:7] == "decimal":
+            epochs = values.astype(str)
+        else:
+            return values.tolist()
+        converted = epochs.astype(object)
+        converted[missing] = None
+        return converted.tolist()
+
+    @staticmethod
+    def _convert_records(attributes: dict, records: list, fetch_blobs=False) -> list:
+        """
+        Convert fetched records into JSON-friendly rows. TEMPORAL types become epoch
+        seconds, decimals become strings, numpy scalars become Python values and blobs are
+        replaced with ``=BLOB=`` unless ``fetch_blobs`` is set.
+
+        Args:
+            attributes: Heading attributes of the records, in column order.
+            records: Records in dictionary form.
+            fetch_blobs (optional): Whether blob values are kept, defaults to ``False``.
+
+        Returns:
+            Records as a list of rows.
+        """
+
+        converters = _DJConnector._record_converters(
+            tuple(
+                (
+                    attribute_name,
+                    attribute_info.type,
+                    bool(
+                        attribute_info.is_blob
+                        or attribute_info.is_attachment
+                        or attribute_info.is_filepath
+                        or attribute_info.json
+                    ),
+                )
+                for attribute_name, attribute_info in attributes.items()
+            ),
+            fetch_blobs,
+        )
+        # Convert column by column so each converter runs in a tight loop, then
+        # transpose back into rows. Blobs are not fetched unless requested so their
+        # placeholder column is filled without looking up the records.
+        columns = [
+            (
+                [_blob_placeholder(None)] * len(records)
+                if convert is _blob_placeholder
+                else [convert(record[attribute_name]) for record in records]
+            )
+            for attribute_name, convert in converters
+        ]
+        return (
+            [list(row) for row in zip(*columns)] if columns else [[] for _ in records]
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _record_converters(heading_signature: tuple, fetch_blobs: bool) -> tuple:
+        """
+        Compile the per-column conversion plan of a heading, cached by heading signature.
+
+        Args:
+            heading_signature: Sequence of ``(attribute_name, type, is_blob_like)``.
+            fetch_blobs: Whether blob values are kept.
+
+        Returns:
+            Sequence of ``(attribute_name, converter)`` pairs in column order.
+        """
+
+        converters = []
+        for attribute_name, attribute_type, is_blob_like in heading_signature:
+            if is_blob_like:
+                convert = _keep_value if fetch_blobs else _blob_placeholder
+            elif attribute_type == "date":
+                convert = _date_to_epoch
+            elif attribute_type == "time":
+                convert = _time_to_seconds
+            elif attribute_type.startswith(("datetime", "timestamp")):
+                convert = _datetime_to_epoch
+            elif attribute_type[0:7] == "decimal":
+                convert = _decimal_to_str
+            else:
+                convert = _plain_value
+            converters.append((attribute_name, convert))
+        return tuple(converters)
 
     @staticmethod
     def _get_attributes(query, include_unique_values=False) -> dict:
@@ -312,12 +1480,11 @@ class _DJConnector:
             Definition of the table as a string.
         """
 
-        local_values = locals()
-        local_values[schema_name] = dj.VirtualModule(
-            schema_name, schema_name, connection=connection
+        schema_virtual_module = _DJConnector._get_virtual_module(
+            connection, schema_name
         )
         return _DJConnector._get_table_object(
-            local_values[schema_name], table_name
+            schema_virtual_module, table_name
         ).describe()
 
     @staticmethod
@@ -337,12 +1504,12 @@ class _DJConnector:
             tuple_to_insert: Record to be inserted as a dictionary.
         """
 
-        schema_virtual_module = dj.VirtualModule(
-            schema_name, schema_name, connection=connection
-        )
-        _DJConnector._get_table_object(schema_virtual_module, table_name).insert(
-            tuple_to_insert
+        schema_virtual_module = _DJConnector._get_virtual_module(
+            connection, schema_name
         )
+        table = _DJConnector._get_table_object(schema_virtual_module, table_name)
+        table.insert(tuple_to_insert)
+        _result_cache.invalidate([table.full_table_name])
 
     @staticmethod
     def _record_dependency(
@@ -366,9 +1533,7 @@ class _DJConnector:
             List of tables that are dependent on specific records.
         """
 
-        virtual_module = dj.VirtualModule(
-            schema_name, schema_name, connection=connection
-        )
+        virtual_module = _DJConnector._get_virtual_module(connection, schema_name)
         table = _DJConnector._get_table_object(virtual_module, table_name)
         attributes = table.heading.attributes
         # Retrieve dependencies of related to retricted
@@ -415,16 +1580,13 @@ class _DJConnector:
 
         """
 
-        schema_virtual_module = dj.VirtualModule(
-            schema_name, schema_name, connection=connection
+        schema_virtual_module = _DJConnector._get_virtual_module(
+            connection, schema_name
         )
+        table = _DJConnector._get_table_object(schema_virtual_module, table_name)
         with connection.transaction:
-            [
-                _DJConnector._get_table_object(
-                    schema_virtual_module, table_name
-                ).update1(t)
-                for t in tuple_to_update
-            ]
+            [table.update1(t) for t in tuple_to_update]
+        _result_cache.invalidate([table.full_table_name])
 
     @staticmethod
     def _delete_records(
@@ -446,8 +1608,8 @@ class _DJConnector:
             cascade: Allow for cascading delete, defaults to ``False``.
         """
 
-        schema_virtual_module = dj.VirtualModule(
-            schema_name, schema_name, connection=connection
+        schema_virtual_module = _DJConnector._get_virtual_module(
+            connection, schema_name
         )
 
         # Get table object from name
@@ -466,6 +1628,9 @@ class _DJConnector:
 
         # All check pass thus proceed to delete
         query.delete(safemode=False) if cascade else query.delete_quick()
+        _result_cache.invalidate(
+            table.descendants() if cascade else [table.full_table_name]
+        )
 
     @staticmethod
     def _get_table_object(
@@ -0,0 +1,207 @@
+"""JSON serialization of responses."""
+
+import json
+import math
+from base64 import b64encode
+from datetime import date, datetime
+from os import environ
+from uuid import UUID
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+def convert(o):
+    """
+    Convert objects the JSON serializers do not support natively.
+
+    Args:
+        o: Object to convert.
+
+    Returns:
+        A JSON serializable equivalent: NumPy scalars and arrays become Python numbers
+            and lists, UUIDs strings and dates ISO 8601 strings.
+    """
+
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, UUID):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _finite(o):
+    # Non-finite floats become None, as orjson serializes them, since the standard
+    # library would write NaN and Infinity which are not valid JSON
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    if isinstance(o, dict):
+        return {k: _finite(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_finite(v) for v in o]
+    return o
+
+
+# Plotly typed array codes of NumPy data types
+TYPED_ARRAY_DTYPES = dict(
+    int8="i1",
+    uint8="u1",
+    int16="i2",
+    uint16="u2",
+    int32="i4",
+    uint32="u4",
+    float32="f4",
+    float64="f8",
+)
+
+
+def typed_array(a: np.ndarray) -> dict:
+    """
+    Encode a numeric array as a Plotly typed array, i.e. its little-endian binary data
+    in base64. 64-bit integers are narrowed to 32 bits, which they must fit in, as
+    Plotly does not support them.
+
+    Args:
+        a: Array to encode.
+
+    Returns:
+        A dictionary with ``dtype``, ``bdata`` and, for arrays of more than one
+            dimension, ``shape`` (e.g. ``"2, 3"``), or ``None`` if the array is empty or
+            cannot be encoded.
+    """
+
+    if not a.size:
+        return None
+    if a.dtype.kind in "iu" and a.dtype.itemsize == 8:
+        narrow = np.dtype(f"{a.dtype.kind}4")
+        if a.min() < np.iinfo(narrow).min or a.max() > np.iinfo(narrow).max:
+            return None
+        a = a.astype(narrow)
+    if (dtype := TYPED_ARRAY_DTYPES.get(a.dtype.name)) is None:
+        return None
+    typed = dict(
+        dtype=dtype,
+        bdata=b64encode(
+            np.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<")).tobytes()
+        ).decode("ascii"),
+    )
+    if a.ndim > 1:
+        typed["shape"] = ", ".join(str(d) for d in a.shape)
+    return typed
+
+
+def convert_typed(o):
+    """
+    Same as :func:`convert` but encodes numeric arrays with :func:`typed_array`.
+
+    Args:
+        o: Object to convert.
+
+    Returns:
+        A JSON serializable equivalent.
+    """
+
+    if isinstance(o, np.ndarray) and (typed := typed_array(o)) is not None:
+        return typed
+    return convert(o)
+
+
+def use_orjson() -> bool:
+    """
+    Whether responses are serialized with ``orjson``.
+
+    Returns:
+        ``True`` if ``orjson`` is installed, unless ``PHARUS_JSON_SERIALIZER`` is set to
+            ``json`` to use the standard library.
+    """
+
+    return orjson is not None and environ.get("PHARUS_JSON_SERIALIZER") != "json"
+
+
+def dumps(
+    obj,
+    sort_keys: bool = False,
+    indent: int = None,
+    default=None,
+    native_dates: bool = True,
+    typed_arrays: bool = False,
+) -> str:
+    """
+    Serialize an object as JSON, using ``orjson`` if available. NumPy scalars and
+    C-contiguous numeric arrays are serialized natively and non-finite floats as
+    ``null``. Objects ``orjson`` cannot serialize, e.g. integers beyond 64 bits, fall
+    back to the standard library.
+
+    Args:
+        obj: Object to serialize.
+        sort_keys (optional): Sort the keys of dictionaries, defaults to ``False``.
+        indent (optional): Indent nested structures by 2 spaces if set, defaults to
+            ``None``.
+        default (optional): Conversion of objects not supported natively, defaults to
+            :func:`convert`.
+        native_dates (optional): Serialize dates as ISO 8601 strings natively instead
+            of converting them with ``default``, defaults to ``True``.
+        typed_arrays (optional): Encode numeric arrays as Plotly typed arrays instead
+            of lists, see :func:`typed_array`, defaults to ``False``. Only applies
+            without a custom ``default``.
+
+    Returns:
+        JSON document.
+    """
+
+    if default is None:
+        default = convert_typed if typed_arrays else convert
+    if use_orjson():
+        option = orjson.OPT_NON_STR_KEYS
+        if default is not convert_typed:
+            option |= orjson.OPT_SERIALIZE_NUMPY
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if not native_dates:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode()
+        except (TypeError, orjson.JSONEncodeError):
+            pass
+    return json.dumps(
+        _finite(obj),
+        default=lambda o: _finite(default(o)),
+        sort_keys=sort_keys,
+        indent=indent,
+        **({} if indent else dict(separators=(",", ":"))),
+    )
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider serializing the dictionaries returned by routes with
+    :func:`dumps`, while keeping Flask's conversion of dates, decimals, UUIDs and
+    dataclasses.
+    """
+
+    @staticmethod
+    def _default(o):
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(
+            obj,
+            sort_keys=kwargs.get("sort_keys", self.sort_keys),
+            indent=kwargs.get("indent"),
+            default=kwargs.get("default", self._default),
+            native_dates=False,
+        )
@@ -1,13 +1,23 @@
 """Exposed REST API."""
 
-from os import environ
+from os import environ, stat
 from pathlib import Path
 from envyaml import EnvYAML
-from .interface import _DJConnector
+from .interface import _DJConnector, _count_cache, _result_cache, _single_flight
+from .connection_pool import ConnectionPool
+from .error import ConnectionPoolExhausted
+from .cache import TTLCache
+from .component_interface import (
+    conditional_response,
+    requested_mimetype,
+    stream_records,
+)
+from .compression import compress_response
+from .serialization import JSONProvider
 import datajoint as dj
 from . import __version__ as version
 from typing import Callable
-from functools import wraps
+from functools import wraps, lru_cache
 from typing import Union
 import pymysql
 
@@ -17,8 +27,9 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.backends import default_backend as crypto_default_backend
 
 from requests.auth import HTTPBasicAuth
-from flask import Flask, request
+from flask import Flask, Response, request, send_file
 import jwt
+from jwt.algorithms import RSAAlgorithm
 import requests
 from json import loads
 from base64 import b64decode
@@ -27,8 +38,12 @@ from datajoint.table import foreign_key_error_regexp
 from datajoint.utils import to_camel_case
 import traceback
 import time
+import hashlib
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
+# Compress responses of every route, including those generated from the spec
+app.after_request(compress_response)
 # Check if PRIVATE_KEY and PUBIC_KEY is set, if not generate them.
 # NOTE: For web deployment, please set the these enviorment variable to be the same between
 # the instance
@@ -53,6 +68,102 @@ if (
         .decode()
     )
 
+# Warm DataJoint connections reused across requests bearing the same credentials
+connection_pool = ConnectionPool(
+    max_size=int(environ.get("PHARUS_POOL_MAX_SIZE", 8)),
+    idle_timeout=float(environ.get("PHARUS_POOL_IDLE_TIMEOUT", 300)),
+    checkout_timeout=float(environ.get("PHARUS_POOL_CHECKOUT_TIMEOUT", 30)),
+)
+# Service account connections shared by all routes of a spec without authentication
+service_pool = ConnectionPool(
+    max_size=int(environ.get("PHARUS_SERVICE_POOL_SIZE", 8)),
+    idle_timeout=float(environ.get("PHARUS_POOL_IDLE_TIMEOUT", 300)),
+    checkout_timeout=float(environ.get("PHARUS_POOL_CHECKOUT_TIMEOUT", 30)),
+    max_uses=(
+        int(environ["PHARUS_SERVICE_POOL_MAX_USES"])
+        if "PHARUS_SERVICE_POOL_MAX_USES" in environ
+        else None
+    ),
+    max_lifetime=(
+        float(environ["PHARUS_SERVICE_POOL_MAX_LIFETIME"])
+        if "PHARUS_SERVICE_POOL_MAX_LIFETIME" in environ
+        else None
+    ),
+)
+# Verified token claims keyed by token digest, each expiring no later than its token
+jwt_cache = TTLCache(
+    max_entries=int(environ.get("PHARUS_JWT_CACHE_SIZE", 1024)),
+    ttl=float(environ.get("PHARUS_JWT_CACHE_TTL", 300)),
+)
+# Serialized specs of the getSpecOverride hook, by the cache key it declares
+spec_cache = TTLCache(
+    max_entries=int(environ.get("PHARUS_SPEC_CACHE_SIZE", 64)),
+    ttl=float(environ.get("PHARUS_SPEC_CACHE_TTL", 300)),
+)
+
+
+@lru_cache(maxsize=1)
+def _oidc_public_key(encoded_key: str):
+    """
+    Parse the OIDC provider's Base64-encoded DER public key once.
+
+    Args:
+        encoded_key: Value of ``PHARUS_OIDC_PUBLIC_KEY``.
+
+    Returns:
+        Public key object used to verify OIDC access tokens.
+    """
+
+    return crypto_serialization.load_der_public_key(b64decode(encoded_key.encode()))
+
+
+@lru_cache(maxsize=1)
+def _public_key(encoded_key: str):
+    """
+    Parse the server's PEM or OpenSSH public key once.
+
+    Args:
+        encoded_key: Value of ``PHARUS_PUBLIC_KEY``.
+
+    Returns:
+        Public key object used to verify tokens issued by ``/login``.
+    """
+
+    return RSAAlgorithm(RSAAlgorithm.SHA256).prepare_key(encoded_key)
+
+
+def _decode_jwt(encoded_jwt: str, oidc: bool = False) -> dict:
+    """
+    Verify and decode a bearer token, reusing the claims of previously verified tokens.
+
+    Args:
+        encoded_jwt: Encoded bearer token.
+        oidc (optional): Whether the token was issued by the OIDC provider instead of
+            ``/login``, defaults to ``False``.
+
+    Returns:
+        Copy of the decoded token claims.
+    """
+
+    key = (oidc, hashlib.sha256(encoded_jwt.encode()).hexdigest())
+    claims = jwt_cache.get(key)
+    if claims is None:
+        if oidc:
+            claims = jwt.decode(
+                encoded_jwt,
+                _oidc_public_key(environ.get("PHARUS_OIDC_PUBLIC_KEY")),
+                algorithms="RS256",
+                options=dict(verify_aud=False),
+            )
+        else:
+            claims = jwt.decode(
+                encoded_jwt,
+                _public_key(environ["PHARUS_PUBLIC_KEY"]),
+                algorithms="RS256",
+            )
+        jwt_cache.set(key, claims, expires_at=claims.get("exp"))
+    return dict(claims)
+
 
 def doublewrap(f):
     """
@@ -76,6 +187,64 @@ def doublewrap(f):
     return new_dec
 
 
+def _call_pooled(
+    pool: ConnectionPool,
+    function: Callable,
+    host: str,
+    user: str,
+    password: str,
+    **kwargs,
+):
+    """
+    Call a route function with a connection checked out of a pool. The connection is
+    returned to the pool once the function returns or, for streamed responses, once the
+    last chunk has been sent.
+
+    Args:
+        pool: Pool to check the connection out of.
+        function: Route function taking the connection as first argument.
+        host: Database address.
+        user: Database user.
+        password: Database password (or OIDC access token).
+        kwargs: Keyword arguments of the route function.
+
+    Returns:
+        Response of the route function.
+    """
+
+    connection = pool.checkout(host, user, password)
+    try:
+        response = function(connection, **kwargs)
+    except BaseException:
+        pool.release(connection)
+        raise
+    if isinstance(response, Response) and response.is_streamed:
+        # The response generator keeps using the connection after the route returns
+        response.call_on_close(lambda: pool.release(connection))
+    else:
+        pool.release(connection)
+    return response
+
+
+def _pool_exhausted(error: ConnectionPoolExhausted) -> tuple:
+    """
+    Response to a request for which no pooled connection became available in time.
+
+    Args:
+        error: Exception raised by :meth:`ConnectionPool.checkout`.
+
+    Returns:
+        ``503 Service Unavailable`` asking the client to retry after
+            ``PHARUS_POOL_RETRY_AFTER`` seconds (defaults to 1).
+    """
+
+    return (
+        str(error),
+        503,
+        {"Retry-After": environ.get("PHARUS_POOL_RETRY_AFTER", "1")},
+    )
+
+
 @doublewrap
 def protected_route(function: Callable, include_user_obj: bool = False) -> Callable:
     """
@@ -90,6 +259,11 @@ def protected_route(function: Callable, include_user_obj: bool = False) -> Calla
     If include_user_obj is set to True, then the wrapped function should
     accept a kwarg user_obj which will contain the decoded JWT token.
 
+    The connection handed to the wrapped function is checked out of ``connection_pool``
+    for the duration of the request and returned to it afterwards, see
+    :func:`_call_pooled`. Requests are answered with ``503 Service Unavailable`` when
+    the pool remains exhausted, see :func:`_pool_exhausted`.
+
     Args:
         function: Function to decorate, typically routes
 
@@ -102,14 +276,7 @@ def protected_route(function: Callable, include_user_obj: bool = False) -> Calla
         try:
             if "database_host" in request.args:
                 encoded_jwt = request.headers.get("Authorization").split()[1]
-                decoded_jwt = jwt.decode(
-                    encoded_jwt,
-                    crypto_serialization.load_der_public_key(
-                        b64decode(environ.get("PHARUS_OIDC_PUBLIC_KEY").encode())
-                    ),
-                    algorithms="RS256",
-                    options=dict(verify_aud=False),
-                )
+                decoded_jwt = _decode_jwt(encoded_jwt, oidc=True)
                 connect_creds = {
                     "databaseAddress": request.args["database_host"],
                     "username": decoded_jwt[environ.get("PHARUS_OIDC_SUBJECT_KEY")],
@@ -117,19 +284,21 @@ def protected_route(function: Callable, include_user_obj: bool = False) -> Calla
                     "groups": decoded_jwt.get("groups", []),
                 }
             else:
-                connect_creds = jwt.decode(
-                    request.headers.get("Authorization").split()[1],
-                    environ["PHARUS_PUBLIC_KEY"],
-                    algorithms="RS256",
+                connect_creds = _decode_jwt(
+                    request.headers.get("Authorization").split()[1]
                 )
-            connection = dj.Connection(
+            if include_user_obj:
+                kwargs.update(user_obj=connect_creds)
+            return _call_pooled(
+                connection_pool,
+                function,
                 host=connect_creds["databaseAddress"],
                 user=connect_creds["username"],
                 password=connect_creds["password"],
+                **kwargs,
             )
-            if include_user_obj:
-                kwargs.update(user_obj=connect_creds)
-            return function(connection, **kwargs)
+        except ConnectionPoolExhausted as e:
+            return _pool_exhausted(e)
         except Exception as e:
             return str(e), 401
 
@@ -137,6 +306,41 @@ def protected_route(function: Callable, include_user_obj: bool = False) -> Calla
     return wrapper
 
 
+def service_route(function: Callable) -> Callable:
+    """
+    Route function decorator for specs without authentication. The wrapped function
+    receives a connection of the service account defined by ``PHARUS_HOST``,
+    ``PHARUS_USER`` and ``PHARUS_PASSWORD``, checked out of ``service_pool`` for the
+    duration of the request. Requests are answered with ``503 Service Unavailable``
+    when the pool remains exhausted and with the traceback of any other error.
+
+    Args:
+        function: Function to decorate, typically routes
+
+    Returns:
+        Wrapped function
+    """
+
+    @wraps(function)
+    def wrapper(**kwargs):
+        try:
+            return _call_pooled(
+                service_pool,
+                function,
+                host=environ["PHARUS_HOST"],
+                user=environ["PHARUS_USER"],
+                password=environ["PHARUS_PASSWORD"],
+                **kwargs,
+            )
+        except ConnectionPoolExhausted as e:
+            return _pool_exhausted(e)
+        except Exception:
+            return traceback.format_exc(), 500
+
+    wrapper.__name__ = function.__name__
+    return wrapper
+
+
 @app.route(f"{environ.get('PHARUS_PREFIX', '')}/version", methods=["GET"])
 def api_version() -> str:
     """
@@ -187,17 +391,18 @@ def login() -> dict:
         behalf. Due to this, it is required that remote hosts expose the server only
         under HTTPS to ensure end-to-end encryption. Sending passwords in plain text over
         HTTPS in POST request body is common and utilized by companies such as GitHub
-        (2021) and Chase Bank (2021). On server side, there is no caching, logging, or
-        storage of received passwords or tokens and thus available only briefly in
-        memory. This means the primary vulnerable point is client side. Users should be
-        responsible with their passwords and bearer tokens treating them as
-        one-in-the-same. Be aware that if your client system happens to be compromised,
-        a bad actor could monitor your outgoing network requests and capture/log your
-        credentials. However, in such a terrible scenario, a bad actor would not only
-        collect credentials for your DataJoint database but also other sites such as
-        github.com, chase.com, etc. Please be responsible and vigilant with credentials
-        and tokens on client side systems. Improvements to the above strategy is
-        currently being tracked in https://github.com/datajoint/pharus/issues/82.
+        (2021) and Chase Bank (2021). On server side, there is no logging or persistent
+        storage of received passwords or tokens. They are only held in memory by the
+        verified token cache (see ``PHARUS_JWT_CACHE_TTL``) and the connection pool
+        (see ``PHARUS_POOL_IDLE_TIMEOUT``). This means the primary vulnerable point is
+        client side. Users should be responsible with their passwords and bearer tokens
+        treating them as one-in-the-same. Be aware that if your client system happens to
+        be compromised, a bad actor could monitor your outgoing network requests and
+        capture/log your credentials. However, in such a terrible scenario, a bad actor
+        would not only collect credentials for your DataJoint database but also other
+        sites such as github.com, chase.com, etc. Please be responsible and vigilant
+        with credentials and tokens on client side systems. Improvements to the above
+        strategy is currently being tracked in https://github.com/datajoint/pharus/issues/82.
 
     Returns:
         Function output is an encoded JWT if successful, otherwise return error message
@@ -285,9 +490,7 @@ def login() -> dict:
                     "databaseAddress": request.args["database_host"],
                     "username": jwt.decode(
                         auth_info["jwt"],
-                        crypto_serialization.load_der_public_key(
-                            b64decode(environ.get("PHARUS_OIDC_PUBLIC_KEY").encode())
-                        ),
+                        _oidc_public_key(environ.get("PHARUS_OIDC_PUBLIC_KEY")),
                         algorithms="RS256",
                         options=dict(verify_aud=False),
                     )[environ.get("PHARUS_OIDC_SUBJECT_KEY")],
@@ -587,15 +790,39 @@ def record(
         restrict as `[{"attributeName": "computer_memory", "operation": ">=", "value": 16}]`
         with this param set as `W3siYXR0cmlidXRlTmFtZSI6ICJjb21wdXRlcl9tZW1vcnkiLCAib3BlcmF0a
         W9uIjogIj49IiwgInZhbHVlIjogMTZ9XQo=`. Defaults to no restriction.
+    * format: Set to `columnar` to receive `columns`, a mapping of each attribute to its
+        list of values, instead of `records`. Values are converted with vectorized
+        operations and `NaN` is returned as `null`. Defaults to row-major `records`.
+    * cursor: Opaque `nextCursor` of the previous page, or empty for the first page, to
+        seek to the next page instead of skipping `(page - 1) * limit` records. The
+        response then includes `nextCursor`, `null` on the last page. Deep pages are
+        fetched as fast as the first one. Only attributes may be used in `order` and
+        `page` is ignored. Defaults to offset paging.
+    * count: How `totalCount` is computed. `exact` counts the records, `none` skips
+        counting and returns `null`, `estimate` uses table statistics or query plan row
+        estimates and `cached` reuses an exact count of the same query for
+        `PHARUS_COUNT_CACHE_TTL` seconds. Defaults to `exact`.
+
+    All records are instead streamed as newline-delimited JSON, one object per record,
+    when requested with `Accept: application/x-ndjson`, or in the Apache Arrow IPC
+    streaming format, one record batch at a time, when requested with
+    `Accept: application/vnd.apache.arrow.stream`. Arrow requires `pyarrow` to be
+    installed. `limit`, `page`, `cursor`, `count` and `format` do not apply to streamed
+    records.
 
     #### Request Headers
     * Authorization: Bearer <OAuth2_token\>
+    * If-None-Match: `ETag` of a cached response, to only get the response back if
+        the table changed since.
 
     #### Response Headers
-    * Content-Type: text/plain, application/json
+    * Content-Type: text/plain, application/json, application/x-ndjson,
+        application/vnd.apache.arrow.stream
+    * ETag: Weak entity tag of the response.
 
     #### Status Codes
     * 200 OK: No error.
+    * 304 Not Modified: The cached response matching `If-None-Match` is current.
     * 500 Internal Server Error: Unexpected error encountered. Returns the error message as a
         string.
 
@@ -810,28 +1037,64 @@ def record(
     )
     if request.method in {"GET", "HEAD"}:
         try:
-            schema_virtual_module = dj.VirtualModule(
-                schema_name, schema_name, connection=connection
+            schema_virtual_module = _DJConnector._get_virtual_module(
+                connection, schema_name
             )
 
             # Get table object from name
             dj_table = _DJConnector._get_table_object(schema_virtual_module, table_name)
 
-            record_header, table_tuples, total_count = _DJConnector._fetch_records(
-                query=dj_table,
-                **{
-                    k: int(v) for k, v in request.args.items() if k in ("limit", "page")
-                },
-                **{
-                    k: loads(b64decode(v.encode("utf-8")).decode("utf-8"))
-                    for k, v in request.args.items()
-                    if k == "restriction"
-                },
-                **{k: v.split(",") for k, v in request.args.items() if k == "order"},
-            )
-            return dict(
-                recordHeader=record_header, records=table_tuples, totalCount=total_count
-            )
+            def respond():
+                if (mimetype := requested_mimetype()) != "application/json":
+                    return stream_records(
+                        mimetype,
+                        query=dj_table,
+                        **{
+                            k: loads(b64decode(v.encode("utf-8")).decode("utf-8"))
+                            for k, v in request.args.items()
+                            if k == "restriction"
+                        },
+                        **{
+                            k: v.split(",")
+                            for k, v in request.args.items()
+                            if k == "order"
+                        },
+                    )
+                columnar = request.args.get("format") == "columnar"
+                record_header, table_tuples, total_count, *next_cursor = (
+                    _DJConnector._fetch_columns
+                    if columnar
+                    else _DJConnector._fetch_records
+                )(
+                    query=dj_table,
+                    **{
+                        k: int(v)
+                        for k, v in request.args.items()
+                        if k in ("limit", "page")
+                    },
+                    **{
+                        k: loads(b64decode(v.encode("utf-8")).decode("utf-8"))
+                        for k, v in request.args.items()
+                        if k == "restriction"
+                    },
+                    **{
+                        k: v.split(",") for k, v in request.args.items() if k == "order"
+                    },
+                    **{
+                        k: v
+                        for k, v in request.args.items()
+                        if k in ("cursor", "count")
+                    },
+                )
+                return dict(
+                    recordHeader=record_header,
+                    **{"columns" if columnar else "records": table_tuples},
+                    totalCount=total_count,
+                    **{"nextCursor": c for c in next_cursor},
+                )
+
+            # Tagged from an instance, as table classes do not expose the query's SQL
+            return conditional_response(dj_table(), respond)
         except Exception:
             return traceback.format_exc(), 500
     elif request.method == "POST":
@@ -883,6 +1146,121 @@ def record(
             return traceback.format_exc(), 500
 
 
+@app.route(
+    f"{environ.get('PHARUS_PREFIX', '')}/schema/<schema_name>/table/<table_name>/export",
+    methods=["GET"],
+)
+@protected_route
+def export(
+    connection: dj.Connection,
+    schema_name: str,
+    table_name: str,
+) -> Union[Response, tuple]:
+    r"""
+    Handler for ``/schema/{schema_name}/table/{table_name}/export`` route.
+
+    Args:
+        connection (dj.Connection): User's DataJoint connection object
+        schema_name (str): Schema name.
+        table_name (str): Table name.
+
+    Returns:
+        If successful, then sends back all records of the table as a file; otherwise,
+            returns an error.
+
+    ## GET /schema/{schema_name}/table/{table_name}/export
+
+    Route to export all records of a table as CSV or Parquet. Records are read in
+    primary key ranges and written to a file that is spilled to disk once it exceeds
+    `PHARUS_EXPORT_MEMORY_BUDGET` bytes (defaults to 64 MiB), which is then streamed
+    back. Blobs are not exported. Requires `pyarrow`.
+
+    ### Example request:
+
+    ```http
+    GET /schema/alpha_company/table/Computer/export?format=csv HTTP/1.1
+    Host: fakeservices.datajoint.io
+    Authorization: Bearer <token>
+    ```
+
+    ### Example successful response:
+
+    ```http
+    HTTP/1.1 200 OK
+    Content-Type: text/csv; charset=utf-8
+    Content-Disposition: attachment; filename=Computer.csv
+
+    "computer_id","computer_serial","computer_brand","computer_built",...
+    "4e41491a-86d5-4af7-a013-89bde75528bd","DJS1JA17G","Dell",2020-05-25,...
+    ```
+
+    ### Example unexpected response:
+
+    ```http
+    HTTP/1.1 500 Internal Server Error
+    Vary: Accept
+    Content-Type: text/plain
+
+    400 Bad Request: The browser (or proxy) sent a request that this server could not
+        understand.
+    ```
+
+    #### Query Parameters
+    * schema_name: Schema name.
+    * table_name: Table name.
+    * format: `csv` or `parquet`. Defaults to `csv`.
+    * restriction: Base64-encoded `AND` sequence of restrictions, see
+        `/schema/{schema_name}/table/{table_name}/record`. Defaults to no restriction.
+    * partitions: Number of primary key ranges fetched concurrently on separate pooled
+        connections, fewer if fewer connections are available. Defaults to `1`.
+
+    #### Request Headers
+    * Authorization: Bearer <OAuth2_token\>
+
+    #### Response Headers
+    * Content-Type: text/plain, text/csv, application/vnd.apache.parquet
+    * Content-Disposition: attachment; filename={table_name}.{format}
+
+    #### Status Codes
+    * 200 OK: No error.
+    * 500 Internal Server Error: Unexpected error encountered. Returns the error message as a
+        string.
+    """
+
+    if request.method in {"GET", "HEAD"}:
+        try:
+            export_format = request.args.get("format", "csv")
+            export_file = _DJConnector._export(
+                _DJConnector._get_table_object(
+                    _DJConnector._get_virtual_module(connection, schema_name),
+                    table_name,
+                ),
+                restriction=(
+                    loads(b64decode(request.args["restriction"].encode("utf-8")))
+                    if "restriction" in request.args
+                    else []
+                ),
+                export_format=export_format,
+                memory_budget=int(
+                    environ.get("PHARUS_EXPORT_MEMORY_BUDGET", 64 * 1024 * 1024)
+                ),
+                partitions=int(request.args.get("partitions", 1)),
+            )
+            return send_file(
+                export_file,
+                mimetype=(
+                    "text/csv"
+                    if export_format == "csv"
+                    else "application/vnd.apache.parquet"
+                ),
+                as_attachment=True,
+                download_name=f"{table_name}.{export_format}",
+                conditional=False,
+            )
+        except Exception:
+            return traceback.format_exc(), 500
+
+
 @app.route(
     f"{environ.get('PHARUS_PREFIX', '')}/schema/<schema_name>/table/<table_name>/definition",
     methods=["GET"],
@@ -953,22 +1331,26 @@ def definition(
 
     #### Request Headers
     * Authorization: Bearer <OAuth2_token\>
+    * If-None-Match: `ETag` of a cached response, to only get the response back if
+        the table changed since.
 
     #### Response Headers
     * Content-Type: text/plain
+    * ETag: Weak entity tag of the response.
 
     #### Status Codes
     * 200 OK: No error.
+    * 304 Not Modified: The cached response matching `If-None-Match` is current.
     * 500 Internal Server Error: Unexpected error encountered. Returns the error message as a
         string.
     """
 
     if request.method in {"GET", "HEAD"}:
         try:
-            table_definition = _DJConnector._get_table_definition(
-                connection, schema_name, table_name
+            dj_table = _DJConnector._get_table_object(
+                _DJConnector._get_virtual_module(connection, schema_name), table_name
             )
-            return table_definition
+            return conditional_response(dj_table(), dj_table.describe)
         except Exception:
             return traceback.format_exc(), 500
 
@@ -1128,37 +1510,95 @@ def attribute(
 
     #### Request Headers
     * Authorization: Bearer <OAuth2_token\>
+    * If-None-Match: `ETag` of a cached response, to only get the response back if
+        the table changed since.
 
     #### Response Headers
     * Content-Type: text/plain, application/json
+    * ETag: Weak entity tag of the response.
 
     #### Status Codes
     * 200 OK: No error.
+    * 304 Not Modified: The cached response matching `If-None-Match` is current.
     * 500 Internal Server Error: Unexpected error encountered. Returns the error message as a
         string.
     """
 
     if request.method in {"GET", "HEAD"}:
         try:
-            local_values = locals()
-            local_values[schema_name] = dj.VirtualModule(
-                schema_name, schema_name, connection=connection
+            schema_virtual_module = _DJConnector._get_virtual_module(
+                connection, schema_name
             )
 
             # Get table object from name
-            dj_table = _DJConnector._get_table_object(
-                local_values[schema_name], table_name
-            )
+            dj_table = _DJConnector._get_table_object(schema_virtual_module, table_name)
 
-            attributes_meta = _DJConnector._get_attributes(dj_table)
-            return dict(
-                attributeHeaders=attributes_meta["attribute_headers"],
-                attributes=attributes_meta["attributes"],
-            )
+            def respond():
+                attributes_meta = _DJConnector._get_attributes(dj_table)
+                return dict(
+                    attributeHeaders=attributes_meta["attribute_headers"],
+                    attributes=attributes_meta["attributes"],
+                )
+
+            # Tagged from an instance, as table classes do not expose the query's SQL
+            return conditional_response(dj_table(), respond)
         except Exception:
             return traceback.format_exc(), 500
 
 
+def _serialize_spec(sciviz: dict) -> tuple:
+    """
+    Serialize a spec as sent by ``/spec``.
+
+    Args:
+        sciviz: ``SciViz`` section of the spec.
+
+    Returns:
+        The JSON document and its entity tag.
+    """
+
+    body = app.json.dumps(sciviz)
+    return body, hashlib.sha256(body.encode()).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def _spec_file(spec_path: str, inode: int, mtime_ns: int, size: int) -> tuple:
+    """
+    Parse and serialize the spec once per version of the file, identified by its
+    inode, modification time and size.
+
+    Args:
+        spec_path: Value of ``PHARUS_SPEC_PATH``.
+        inode: Inode of the file.
+        mtime_ns: Modification time of the file in nanoseconds.
+        size: Size of the file in bytes.
+
+    Returns:
+        The JSON document and its entity tag, see :func:`_serialize_spec`.
+    """
+
+    return _serialize_spec(EnvYAML(Path(spec_path))["SciViz"])
+
+
+@lru_cache(maxsize=1)
+def _spec_override():
+    """
+    Load the optional ``getSpecOverride`` module once.
+
+    Returns:
+        The module if it defines ``get_spec(connection)``, otherwise ``None``. It may
+            also define ``get_spec_cache_key(connection)``, returning a hashable key
+            that identifies the spec of a connection, to cache the serialized spec
+            under it, or ``None`` not to.
+    """
+
+    try:
+        from . import getSpecOverride
+    except ImportError:
+        return None
+    return getSpecOverride if hasattr(getSpecOverride, "get_spec") else None
+
+
 @app.route(
     f"{environ.get('PHARUS_PREFIX', '')}/spec",
     methods=["GET"],
@@ -1167,20 +1607,36 @@ def attribute(
 def spec(
     connection: dj.Connection,
 ) -> dict:
-    # Returns the currently loaded spec sheet
+    # Returns the currently loaded spec sheet, parsed and serialized once per version of
+    # the file (or cache key of the getSpecOverride hook) and tagged with a weak ETag
+    # for conditional requests
     if request.method in {"GET"}:
         try:
-            try:
-                from .getSpecOverride import get_spec
-            except ImportError:
-
-                def get_spec(connection):
-                    spec_path = environ.get("PHARUS_SPEC_PATH")
-                    return EnvYAML(Path(spec_path))["SciViz"]
-
-            except Exception as e:
-                raise e
-            return get_spec(connection)
+            override = _spec_override()
+            if override is None:
+                spec_path = environ.get("PHARUS_SPEC_PATH")
+                spec_stat = stat(spec_path)
+                body, etag = _spec_file(
+                    spec_path,
+                    spec_stat.st_ino,
+                    spec_stat.st_mtime_ns,
+                    spec_stat.st_size,
+                )
+            else:
+                key = (
+                    override.get_spec_cache_key(connection)
+                    if hasattr(override, "get_spec_cache_key")
+                    else None
+                )
+                if key is None:
+                    return override.get_spec(connection)
+                if (cached := spec_cache.get(key)) is None:
+                    cached = _serialize_spec(override.get_spec(connection))
+                    spec_cache.set(key, cached)
+                body, etag = cached
+            response = Response(body, mimetype="application/json")
+            response.set_etag(etag, weak=True)
+            return response.make_conditional(request)
         except Exception:
             return traceback.format_exc(), 500
 
@@ -1297,6 +1753,113 @@ def dependency(
             return traceback.format_exc(), 500
 
 
+@app.route(f"{environ.get('PHARUS_PREFIX', '')}/stats", methods=["GET"])
+@protected_route
+def stats(connection: dj.Connection) -> dict:
+    r"""
+    Handler for ``/stats`` route.
+
+    Args:
+        connection (dj.Connection): User's DataJoint connection object
+
+    Returns:
+        If successful, then sends back server usage statistics; otherwise, returns an error.
+
+    ## GET /stats
+
+    Route to get usage statistics of the server's connection pools and caches for
+    capacity planning.
+
+    ### Example request:
+
+    ```http
+    GET /stats HTTP/1.1
+    Host: fakeservices.datajoint.io
+    Authorization: Bearer <token>
+    ```
+
+    ### Example successful response:
+
+    ```http
+    HTTP/1.1 200 OK
+    Vary: Accept
+    Content-Type: application/json
+
+    {
+        "connectionPool": {
+            "checkedOut": 1,
+            "evicted": 0,
+            "hits": 41,
+            "idle": 2,
+            "misses": 3,
+            "open": 3,
+            "recycled": 0
+        },
+        "servicePool": {
+            "checkedOut": 0,
+            "evicted": 0,
+            "hits": 0,
+            "idle": 0,
+            "misses": 0,
+            "open": 0,
+            "recycled": 0
+        },
+        "jwtCache": {
+            "evicted": 0,
+            "hits": 44,
+            "misses": 3,
+            "size": 3
+        },
+        "countCache": {
+            "evicted": 0,
+            "hits": 12,
+            "misses": 2,
+            "size": 2
+        },
+        "resultCache": {
+            "bytes": 48213,
+            "evicted": 0,
+            "hits": 57,
+            "invalidated": 1,
+            "misses": 6,
+            "refreshed": 3,
+            "size": 5,
+            "stale": 4
+        },
+        "singleFlight": {
+            "coalesced": 23,
+            "executed": 40,
+            "inFlight": 0
+        }
+    }
+    ```
+
+    #### Request Headers
+    * Authorization: Bearer <OAuth2_token\>
+
+    #### Response Headers
+    * Content-Type: text/plain, application/json
+
+    #### Status Codes
+    * 200 OK: No error.
+    * 500 Internal Server Error: Unexpected error encountered. Returns the error message as a
+        string.
+    """
+
+    if request.method in {"GET", "HEAD"}:
+        try:
+            return dict(
+                connectionPool=connection_pool.stats(),
+                servicePool=service_pool.stats(),
+                jwtCache=jwt_cache.stats(),
+                countCache=_count_cache.stats(),
+                resultCache=_result_cache.stats(),
+                singleFlight=_single_flight.stats(),
+            )
+        except Exception:
+            return traceback.format_exc(), 500
+
+
 def run():
     """
     Starts API server.
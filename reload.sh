@@ -1,14 +1,10 @@
 #!/bin/sh
-PRIMARY_PID="$1"
-# kill background process if previously set
-[ -z "$PRIMARY_PID" ] || kill "$PRIMARY_PID"
-# determine reload mode
+# The spec is reloaded in-process every PHARUS_SPEC_RELOAD_INTERVAL seconds, keeping
+# connections and caches warm, so the server no longer needs restarting when it changes
 if [ "$PHARUS_MODE" == "DEV" ]; then
     export DEBUG=1
     export FLASK_ENV=development
-    pharus &
+    exec pharus
 else
-    gunicorn --bind "0.0.0.0:${PHARUS_PORT}" pharus.server:app &
+    exec gunicorn --bind "0.0.0.0:${PHARUS_PORT}" pharus.server:app
 fi
-PRIMARY_PID="$!"
-echo "$PRIMARY_PID"
@@ -38,6 +38,11 @@ setup(
         "Operating System :: OS Independent",
     ],
     install_requires=requirements,
+    extras_require={
+        "arrow": ["pyarrow"],
+        "compression": ["brotli", "zstandard"],
+        "orjson": ["orjson"],
+    },
     entry_points={
         "console_scripts": [f"{pkg_name}={pkg_name}.server:run"],
     },
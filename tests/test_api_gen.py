@@ -12,6 +12,18 @@ def test_spec_endpoint(token, client):
     assert EnvYAML(Path(spec_path))["SciViz"] == REST_response.get_json()
 
 
+def test_spec_endpoint_etag(token, client):
+    headers = dict(Authorization=f"Bearer {token}")
+    REST_response = client.get("/spec", headers=headers)
+    assert REST_response.status_code == 200
+    etag = REST_response.headers["ETag"]
+    REST_response = client.get(
+        "/spec", headers=dict(headers, **{"If-None-Match": etag})
+    )
+    assert REST_response.status_code == 304
+    assert REST_response.headers["ETag"] == etag
+
+
 def test_auto_generated_route(token, client, schemas_simple):
     # verify crawling over multiple grids
     REST_response1 = client.get(
@@ -188,3 +200,112 @@ def test_fetch_restriction(token, client, schemas_simple):
         }
     )
     assert expected_json == json.dumps(REST_response.get_json(), sort_keys=True)
+
+
+def test_reload_spec(tmp_path, monkeypatch):
+    from flask import Flask
+    from pharus.dynamic_api_gen import populate_api, reload_api
+
+    def write_spec(route):
+        spec_path.write_text(
+            f"""
+SciViz:
+  auth: false
+  pages:
+    page1:
+      route: /page1
+      grids:
+        grid1:
+          type: fixed
+          components:
+            component1:
+              type: antd-table
+              route: {route}
+              dj_query: >
+                def dj_query(vms):
+                    return dict(query=None, fetch_args=[])
+"""
+        )
+
+    def endpoints():
+        return {rule.endpoint for rule in app.url_map.iter_rules()}
+
+    spec_path = tmp_path / "spec.yaml"
+    monkeypatch.setenv("PHARUS_SPEC_PATH", str(spec_path))
+    app = Flask(__name__)
+    write_spec("/query1")
+    populate_api(app)
+    assert {"query1", "query1attributes", "query1uniques"} <= endpoints()
+    # Unchanged spec is not reloaded
+    assert not reload_api(app)
+    # Routes are swapped even once the app is serving requests
+    assert app.test_client().get("/query2").status_code == 404
+    write_spec("/query2")
+    assert reload_api(app)
+    assert {"query2", "query2attributes", "query2uniques"} <= endpoints()
+    assert not {"query1", "query1attributes", "query1uniques"} & endpoints()
+    assert "static" in endpoints()
+    assert app.test_client().get("/query1").status_code == 404
+    # Invalid spec keeps the current routes
+    spec_path.write_text("SciViz: [")
+    assert not reload_api(app)
+    assert {"query2", "query2attributes", "query2uniques"} <= endpoints()
+
+
+def test_reuse_query(monkeypatch):
+    import types
+    from flask import Flask, request
+    from pharus import component_interface
+    from pharus.component_interface import FetchComponent
+
+    def request_restriction():
+        # module-level helper reading the request, which dj_query calls
+        return dict(request.args)
+
+    monkeypatch.setattr(
+        component_interface, "request_restriction", request_restriction, raising=False
+    )
+    virtual_module = types.SimpleNamespace()
+    monkeypatch.setattr(
+        component_interface._DJConnector,
+        "_get_virtual_module",
+        lambda connection, schema_name, module_name=None: virtual_module,
+    )
+    app = Flask(__name__)
+    connection = types.SimpleNamespace()
+
+    def queries(dj_query, **config):
+        component_config = dict(
+            type="antd-table", route="/query", dj_query=dj_query, **config
+        )
+        built = []
+        for a_id in (0, 1):
+            with app.test_request_context(f"/query?a_id={a_id}"):
+                built.append(
+                    FetchComponent(
+                        name="query",
+                        component_config=component_config,
+                        static_config=None,
+                        connection=connection,
+                    ).fetch_metadata["query"]
+                )
+        return built
+
+    helper_query = """
+def dj_query(vms):
+    return dict(query=request_restriction(), fetch_args=[])
+"""
+    # built on every request unless reuse is enabled
+    assert queries(helper_query) == [dict(a_id="0"), dict(a_id="1")]
+    assert queries(helper_query, reuse_query=True) == [dict(a_id="0")] * 2
+    # dj_query using the request itself is never reused
+    assert (
+        queries(
+            """
+def dj_query(vms):
+    return dict(query=dict(request.args), fetch_args=[])
+""",
+            reuse_query=True,
+        )
+        == [dict(a_id="0"), dict(a_id="1")]
+    )
@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pharus.cache import ResultCache, SingleFlight
+
+
+def test_result_cache_budget():
+    cache = ResultCache(max_bytes=10)
+    cache.set("a", b"1234", ttl=60)
+    cache.set("b", b"1234", ttl=60)
+    assert cache.get("a") == b"1234"
+    # Least recently used entry is evicted to fit the budget
+    cache.set("c", b"1234", ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == b"1234"
+    # Values larger than the budget are not cached
+    cache.set("d", b"12345678901", ttl=60)
+    assert cache.get("d") is None
+    assert cache.stats() == dict(
+        hits=3,
+        misses=2,
+        stale=0,
+        refreshed=0,
+        evicted=1,
+        invalidated=0,
+        size=2,
+        bytes=8,
+    )
+
+
+def test_result_cache_expiry_and_invalidation():
+    cache = ResultCache()
+    cache.set("a", b"1", ttl=0.01, tables=["`s`.`a`"])
+    cache.set("b", b"1", ttl=60, tables=["`s`.`a`", "`s`.`b`"])
+    cache.set("c", b"1", ttl=60, tables=["`s`.`c`"])
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    cache.invalidate(["`s`.`b`"])
+    assert cache.get("b") is None
+    assert cache.get("c") == b"1"
+    assert cache.stats()["invalidated"] == 1
+    cache.discard(lambda key: key == "c")
+    assert cache.get("c") is None
+    assert cache.stats()["invalidated"] == 2
+
+
+def test_result_cache_stale_while_revalidate():
+    cache = ResultCache(max_refreshes=1)
+    cache.set("a", b"1", ttl=0.01, max_stale=60)
+    cache.set("b", b"1", ttl=0.01, max_stale=60)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get_stale("a") == (b"1", False)
+    refreshing = threading.Event()
+    # Refreshes are capped and not repeated while in progress
+    assert cache.refresh(
+        "a",
+        lambda: refreshing.wait() and cache.set("a", b"2", ttl=60, max_stale=60),
+    )
+    assert not cache.refresh("a", lambda: None)
+    assert not cache.refresh("b", lambda: None)
+    refreshing.set()
+    cache._executor.shutdown()
+    assert cache.get_stale("a") == (b"2", True)
+    assert cache.stats()["refreshed"] == 1
+
+
+def test_single_flight():
+    single_flight, started, release = (
+        SingleFlight(),
+        threading.Event(),
+        threading.Event(),
+    )
+    calls = []
+
+    def query():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return len(calls)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(single_flight.do, "key", query)
+        started.wait()
+        followers = [executor.submit(single_flight.do, "key", query) for _ in range(3)]
+        while single_flight.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        assert leader.result() == (1, False)
+        assert [f.result() for f in followers] == [(1, True)] * 3
+    assert single_flight.stats() == dict(executed=1, coalesced=3, inFlight=0)
+    # Completed calls are not shared
+    assert single_flight.do("key", query) == (2, False)
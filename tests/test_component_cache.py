@@ -0,0 +1,99 @@
+from . import token, client, connection, schemas_simple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import datajoint as dj
+from pharus.interface import _DJConnector, _result_cache, _single_flight
+
+
+def test_cached_response_invalidated_by_insert(
+    token, client, connection, schemas_simple, monkeypatch
+):
+    monkeypatch.setenv("PHARUS_RESULT_CACHE_TTL", "60")
+    _result_cache.clear()
+    headers = dict(Authorization=f"Bearer {token}")
+    REST_response1 = client.get("/query1", headers=headers)
+    hits = _result_cache.stats()["hits"]
+    REST_response2 = client.get("/query1", headers=headers)
+    # repeated request is served from the cache
+    assert REST_response2.status_code == 200
+    assert REST_response2.get_data() == REST_response1.get_data()
+    assert _result_cache.stats()["hits"] == hits + 1
+    REST_response = client.post(
+        "/insert3?group=test_group1",
+        json={
+            "submissions": [
+                {
+                    "a_id": 1,
+                    "b_id": 32,
+                    "b_number": 1.23,
+                    "c_id": 400,
+                    "c_name": "Smith",
+                }
+            ]
+        },
+        headers=headers,
+    )
+    assert REST_response.status_code == 200, REST_response.data
+    # insert through pharus invalidates the cached response
+    REST_response3 = client.get("/query1", headers=headers)
+    assert 32 in [record[1] for record in REST_response3.get_json()["records"]]
+    _result_cache.clear()
+
+
+def test_concurrent_requests_coalesced(token, client, schemas_simple, monkeypatch):
+    executions = []
+    fetch_records = _DJConnector._fetch_records
+    coalesced = _single_flight.stats()["coalesced"]
+
+    def slow_fetch_records(*args, **kwargs):
+        executions.append(threading.get_ident())
+        # Keep the query running until the other requests wait for it
+        deadline = time.monotonic() + 10
+        while _single_flight.stats()["coalesced"] < coalesced + 4:
+            assert time.monotonic() < deadline, "requests were not coalesced"
+            time.sleep(0.05)
+        return fetch_records(*args, **kwargs)
+
+    monkeypatch.setattr(
+        _DJConnector, "_fetch_records", staticmethod(slow_fetch_records)
+    )
+    barrier = threading.Barrier(5)
+
+    def get():
+        test_client = client.application.test_client()
+        barrier.wait()
+        return test_client.get("/query1", headers=dict(Authorization=f"Bearer {token}"))
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        REST_responses = list(executor.map(lambda _: get(), range(5)))
+    assert len(executions) == 1
+    assert all(r.status_code == 200 for r in REST_responses)
+    assert len({r.get_data() for r in REST_responses}) == 1
+
+
+def test_stale_response_refreshed(
+    token, client, connection, schemas_simple, monkeypatch
+):
+    monkeypatch.setenv("PHARUS_RESULT_CACHE_TTL", "0.5")
+    monkeypatch.setenv("PHARUS_RESULT_CACHE_MAX_STALE", "60")
+    _result_cache.clear()
+    headers = dict(Authorization=f"Bearer {token}")
+    REST_response1 = client.get("/query1", headers=headers)
+    # write bypassing pharus so that the cached response is not invalidated
+    dj.VirtualModule(
+        schemas_simple[0].database, schemas_simple[0].database, connection=connection
+    ).TableB.insert1(dict(a_id=1, b_id=32, b_number=1.23))
+    time.sleep(0.6)
+    refreshed = _result_cache.stats()["refreshed"]
+    REST_response2 = client.get("/query1", headers=headers)
+    # expired response is served while it is refreshed on a sibling connection
+    assert REST_response2.status_code == 200
+    assert REST_response2.get_data() == REST_response1.get_data()
+    deadline = time.monotonic() + 10
+    while _result_cache.stats()["refreshed"] == refreshed:
+        assert time.monotonic() < deadline, "response was not refreshed"
+        time.sleep(0.05)
+    REST_response3 = client.get("/query1", headers=headers)
+    assert 32 in [record[1] for record in REST_response3.get_json()["records"]]
+    _result_cache.clear()
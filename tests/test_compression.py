@@ -0,0 +1,55 @@
+import gzip
+from json import loads
+from urllib.parse import urlencode
+from flask import Response
+from pharus.server import app
+from pharus.compression import compress_response, compression_level
+from . import token, client, connection, schema_main, Student
+
+
+def test_gzip_records(token, client, Student):
+    q = dict(limit=100, page=1, order="student_id ASC")
+    REST_response = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    )
+    assert "Content-Encoding" not in REST_response.headers
+    REST_compressed = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}", **{"Accept-Encoding": "gzip"}),
+    )
+    assert REST_compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in REST_compressed.headers["Vary"]
+    assert len(REST_compressed.data) < len(REST_response.data)
+    assert loads(gzip.decompress(REST_compressed.data)) == REST_response.json
+
+
+def test_gzip_ndjson_stream(token, client, Student):
+    with client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record',
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/x-ndjson",
+            "Accept-Encoding": "gzip",
+        },
+    ) as REST_response:
+        assert REST_response.headers["Content-Encoding"] == "gzip"
+        lines = gzip.decompress(REST_response.data).decode("utf-8").splitlines()
+    assert len(lines) == len(Student())
+
+
+def test_compression_level_clamped(monkeypatch):
+    monkeypatch.setenv("PHARUS_COMPRESSION_ENCODINGS", "gzip")
+    monkeypatch.setenv("PHARUS_COMPRESSION_LEVEL", "11")
+    # levels beyond the range of an encoding are clamped to it
+    assert compression_level("gzip") == 9
+    assert compression_level("br") == 11
+    assert compression_level("zstd") == 11
+    data = b'{"records": []}' * 1000
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        response = compress_response(Response(data, mimetype="application/json"))
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()) == data
+    monkeypatch.setenv("PHARUS_COMPRESSION_LEVEL_GZIP", "1")
+    assert compression_level("gzip") == 1
+    assert compression_level("br") == 11
@@ -0,0 +1,111 @@
+from . import token, client, connection, schema_main, Int
+
+
+def test_record_not_modified(token, client, Int):
+    route = f'/schema/{Int.database}/table/{"Int"}/record'
+    REST_response = client.get(route, headers=dict(Authorization=f"Bearer {token}"))
+    assert REST_response.status_code == 200, REST_response.data
+    etag = REST_response.headers["ETag"]
+    REST_response = client.get(
+        route,
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert REST_response.status_code == 304
+    assert REST_response.headers["ETag"] == etag
+    assert not REST_response.data
+    # Other arguments get another tag
+    REST_response = client.get(
+        f"{route}?limit=5",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert REST_response.status_code == 200
+    assert REST_response.headers["ETag"] != etag
+    # Modifying the table invalidates the tag
+    Int.insert1(dict(id=1, int_attribute=1))
+    REST_response = client.get(
+        route,
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert REST_response.status_code == 200
+    assert REST_response.headers["ETag"] != etag
+    assert REST_response.json["totalCount"] == 1
+
+
+def test_definition_not_modified(token, client, Int):
+    route = f'/schema/{Int.database}/table/{"Int"}/definition'
+    REST_response = client.get(route, headers=dict(Authorization=f"Bearer {token}"))
+    assert REST_response.status_code == 200, REST_response.data
+    REST_response = client.get(
+        route,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "If-None-Match": REST_response.headers["ETag"],
+        },
+    )
+    assert REST_response.status_code == 304
+
+
+def test_attribute_not_modified(token, client, Int):
+    route = f'/schema/{Int.database}/table/{"Int"}/attribute'
+    REST_response = client.get(route, headers=dict(Authorization=f"Bearer {token}"))
+    assert REST_response.status_code == 200, REST_response.data
+    assert REST_response.json["attributeHeaders"]
+    REST_response = client.get(
+        route,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "If-None-Match": REST_response.headers["ETag"],
+        },
+    )
+    assert REST_response.status_code == 304
+
+
+def test_record_columnar_not_modified(token, client, Int):
+    Int.insert1(dict(id=2, int_attribute=2))
+    route = f'/schema/{Int.database}/table/{"Int"}/record?format=columnar'
+    REST_response = client.get(route, headers=dict(Authorization=f"Bearer {token}"))
+    assert REST_response.status_code == 200, REST_response.data
+    assert REST_response.json["totalCount"] == 1
+    REST_response = client.get(
+        route,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "If-None-Match": REST_response.headers["ETag"],
+        },
+    )
+    assert REST_response.status_code == 304
+
+
+def test_response_key(monkeypatch):
+    import types
+    from flask import Flask
+    from pharus.component_interface import FetchComponent, _DJConnector
+
+    virtual_module = types.SimpleNamespace()
+    monkeypatch.setattr(
+        _DJConnector,
+        "_get_virtual_module",
+        lambda connection, schema_name, module_name=None: virtual_module,
+    )
+
+    def response_key(fetch_args, **config):
+        with Flask(__name__).test_request_context("/query"):
+            return FetchComponent(
+                name="query",
+                component_config=dict(
+                    type="antd-table",
+                    route="/query",
+                    dj_query=f"""
+def dj_query(vms):
+    return dict(query=None, fetch_args={fetch_args!r})
+""",
+                    **config,
+                ),
+                static_config=None,
+                connection=types.SimpleNamespace(),
+            ).response_key("dj_query_route")
+
+    # responses of the same query differ with the fetch arguments or configuration
+    assert response_key([]) == response_key([])
+    assert response_key([]) != response_key(["a_id"])
+    assert response_key([]) != response_key([], count="none")
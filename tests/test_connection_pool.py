@@ -0,0 +1,76 @@
+from pharus.connection_pool import ConnectionPool
+from pharus.error import ConnectionPoolExhausted
+from pharus.server import connection_pool, service_pool, service_route
+from flask import Flask
+from . import client, token, get_db_creds
+
+
+def test_connection_reuse(token, client):
+    headers = dict(Authorization=f"Bearer {token}")
+    client.get("/schema", headers=headers)
+    before = client.get("/stats", headers=headers).json["connectionPool"]
+    client.get("/schema", headers=headers)
+    after = client.get("/stats", headers=headers).json["connectionPool"]
+    # both the `/schema` and second `/stats` requests reuse the warm connection
+    assert after["hits"] - before["hits"] == 2
+    assert after["misses"] == before["misses"]
+    assert after["open"] == before["open"]
+
+
+def test_sibling_connection():
+    pool = ConnectionPool(max_size=2)
+    with pool.connection(**get_db_creds()) as connection:
+        with ConnectionPool.sibling(connection) as sibling:
+            assert sibling is not None and sibling is not connection
+            assert sibling.query("SELECT 1").fetchone()[0] == 1
+            # pool is at capacity for these credentials, no waiting for a sibling
+            with ConnectionPool.sibling(connection) as no_sibling:
+                assert no_sibling is None
+    assert pool.stats()["idle"] == 2
+    pool.close_all()
+
+
+def test_pool_exhausted(token, client, monkeypatch):
+    def checkout(host, user, password, timeout=None):
+        raise ConnectionPoolExhausted(f"No connection available for {user}@{host}")
+
+    monkeypatch.setattr(connection_pool, "checkout", checkout)
+    REST_response = client.get("/schema", headers=dict(Authorization=f"Bearer {token}"))
+    # clients are asked to retry rather than to log in again
+    assert REST_response.status_code == 503
+    assert REST_response.headers["Retry-After"] == "1"
+
+
+def test_credentials_pruned():
+    pool = ConnectionPool(idle_timeout=0)
+    with pool.connection(**get_db_creds()):
+        assert len(pool._open) == 1
+    # the idle connection is evicted right away, and the credentials along with it
+    assert pool.stats()["open"] == 0
+    assert not pool._open and not pool._idle
+
+
+def test_service_pool_errors(monkeypatch):
+    app = Flask(__name__)
+
+    @app.route("/service")
+    @service_route
+    def service(connection):
+        return "ok"
+
+    def exhausted(host, user, password, timeout=None):
+        raise ConnectionPoolExhausted(f"No connection available for {user}@{host}")
+
+    def unreachable(host, user, password, timeout=None):
+        raise ConnectionRefusedError(f"Can't connect to {host}")
+
+    for name in ("PHARUS_HOST", "PHARUS_USER", "PHARUS_PASSWORD"):
+        monkeypatch.setenv(name, "unreachable")
+    monkeypatch.setattr(service_pool, "checkout", exhausted)
+    REST_response = app.test_client().get("/service")
+    assert REST_response.status_code == 503
+    assert REST_response.headers["Retry-After"] == "1"
+    monkeypatch.setattr(service_pool, "checkout", unreachable)
+    REST_response = app.test_client().get("/service")
+    assert REST_response.status_code == 500
+    assert "ConnectionRefusedError" in REST_response.get_data(as_text=True)
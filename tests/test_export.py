@@ -0,0 +1,51 @@
+from io import BytesIO, StringIO
+from csv import DictReader
+from json import dumps
+from base64 import b64encode
+from urllib.parse import urlencode
+from . import token, client, connection, schema_main, Student
+import pyarrow.parquet as pq
+
+
+def test_export_csv(token, client, Student):
+    restriction = [dict(attributeName="student_id", operation="<", value=50)]
+    q = dict(
+        format="csv",
+        restriction=b64encode(dumps(restriction).encode("utf-8")).decode("utf-8"),
+    )
+    with client.get(
+        f'/schema/{Student.database}/table/{"Student"}/export?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ) as REST_response:
+        assert REST_response.status_code == 200
+        assert REST_response.mimetype == "text/csv"
+        records = list(DictReader(StringIO(REST_response.data.decode("utf-8"))))
+    assert [int(r["student_id"]) for r in records] == list(range(50))
+    assert list(records[0]) == Student.heading.non_blobs
+
+
+def test_export_parquet(token, client, Student):
+    with client.get(
+        f'/schema/{Student.database}/table/{"Student"}/export?format=parquet',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ) as REST_response:
+        assert REST_response.status_code == 200
+        exported = pq.read_table(BytesIO(REST_response.data))
+    assert exported.num_rows == len(Student())
+    assert exported.column("student_name").to_pylist() == list(
+        Student.fetch("student_name", order_by="KEY")
+    )
+
+
+def test_export_partitions(token, client, Student):
+    REST_exports = []
+    for partitions in (1, 3):
+        with client.get(
+            f'/schema/{Student.database}/table/{"Student"}/export'
+            f"?format=csv&partitions={partitions}",
+            headers=dict(Authorization=f"Bearer {token}"),
+        ) as REST_response:
+            assert REST_response.status_code == 200
+            REST_exports.append(REST_response.data)
+    # ranges are reassembled in primary key order
+    assert REST_exports[0] == REST_exports[1]
@@ -1,8 +1,14 @@
-from json import dumps
+from json import dumps, loads
 from base64 import b64encode
 from urllib.parse import urlencode
 from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from . import token, client, connection, schema_main, Student, Computer
+from pharus import interface
+from pharus.interface import _DJConnector
+from pharus.cache import TTLCache
+import pyarrow as pa
 
 
 def test_filters(token, client, Student):
@@ -81,3 +87,152 @@ def test_uuid_filter(token, client, Computer):
     ).json["records"]
     assert len(REST_records) == 1
     assert REST_records[0][1] == "DELL"
+
+
+def test_columnar_format(token, client, Student):
+    q = dict(limit=10, page=2, order="student_id ASC")
+    REST_rows = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ).json
+    q["format"] = "columnar"
+    REST_columns = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ).json
+    assert "records" not in REST_columns
+    assert REST_columns["recordHeader"] == REST_rows["recordHeader"]
+    assert REST_columns["totalCount"] == REST_rows["totalCount"]
+    assert [
+        list(r)
+        for r in zip(*[REST_columns["columns"][a] for a in REST_rows["recordHeader"]])
+    ] == REST_rows["records"]
+
+
+def test_cursor_pagination(token, client, Student):
+    # nullable attribute in descending order, ties broken by the primary key
+    q = dict(limit=1000, page=1, order="student_parking_lot DESC,student_id ASC")
+    REST_records = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ).json["records"]
+    q = dict(limit=7, order="student_parking_lot DESC", cursor="")
+    cursor_records = []
+    while q["cursor"] is not None:
+        REST_page = client.get(
+            f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+            headers=dict(Authorization=f"Bearer {token}"),
+        ).json
+        assert REST_page["totalCount"] == len(REST_records)
+        cursor_records += REST_page["records"]
+        q["cursor"] = REST_page["nextCursor"]
+    assert cursor_records == REST_records
+
+
+def test_count_policy(token, client, Student):
+    q = dict(limit=10, page=1, order="student_id ASC")
+    REST_counts = {}
+    for count in ("exact", "none", "estimate", "cached", "cached"):
+        REST_page = client.get(
+            f'/schema/{Student.database}/table/{"Student"}/record'
+            f"?{urlencode(dict(q, count=count))}",
+            headers=dict(Authorization=f"Bearer {token}"),
+        ).json
+        assert len(REST_page["records"]) == 10
+        REST_counts.setdefault(count, []).append(REST_page["totalCount"])
+    assert REST_counts["exact"] == [len(Student())]
+    assert REST_counts["none"] == [None]
+    assert isinstance(REST_counts["estimate"][0], int)
+    assert REST_counts["cached"] == REST_counts["exact"] * 2
+
+
+def test_concurrent_count(token, client, Student, monkeypatch):
+    restriction = [dict(attributeName="student_id", operation=">", value="5")]
+    q = dict(
+        limit=10,
+        page=2,
+        order="student_id ASC",
+        restriction=b64encode(dumps(restriction).encode("utf-8")).decode("utf-8"),
+    )
+
+    def get_page():
+        return client.get(
+            f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+            headers=dict(Authorization=f"Bearer {token}"),
+        ).json
+
+    serial_page = get_page()
+    rebound = []
+    rebind = _DJConnector._rebind
+
+    def spy_rebind(query, connection):
+        rebound.append(connection)
+        return rebind(query, connection)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        monkeypatch.setattr(interface, "_count_executor", executor)
+        monkeypatch.setattr(_DJConnector, "_rebind", staticmethod(spy_rebind))
+        concurrent_page = get_page()
+    # the count ran on a sibling connection and matches the serial path
+    assert len(rebound) == 1
+    assert concurrent_page["records"] == serial_page["records"]
+    assert concurrent_page["totalCount"] == serial_page["totalCount"]
+    assert serial_page["totalCount"] == len(Student & "student_id > 5")
+
+
+def test_cached_count_per_user(monkeypatch):
+    class Query:
+        def __init__(self, user, length):
+            self.connection = SimpleNamespace(conn_info=dict(host="db", user=user))
+            self.length = length
+
+        def make_sql(self):
+            return "SELECT * FROM `schema`.`table`"
+
+        def __len__(self):
+            return self.length
+
+    monkeypatch.setattr(interface, "_count_cache", TTLCache(max_entries=8, ttl=60))
+    assert _DJConnector._count(Query("alice", 3), "cached") == 3
+    # the same query counted by another user is not served from the cache
+    assert _DJConnector._count(Query("bob", 1), "cached") == 1
+    assert _DJConnector._count(Query("alice", 5), "cached") == 3
+
+
+def test_ndjson_stream(token, client, Student):
+    q = dict(limit=1000, page=1, order="student_enroll_date DESC,student_id ASC")
+    REST_page = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ).json
+    q = dict(order="student_enroll_date DESC,student_id ASC")
+    with client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}", Accept="application/x-ndjson"),
+    ) as REST_response:
+        assert REST_response.mimetype == "application/x-ndjson"
+        REST_records = [loads(line) for line in REST_response.data.splitlines()]
+    assert [list(r.values()) for r in REST_records] == REST_page["records"]
+    assert all(list(r) == REST_page["recordHeader"] for r in REST_records)
+
+
+def test_arrow_stream(token, client, Student):
+    q = dict(limit=1000, page=1, order="student_id ASC")
+    REST_page = client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record?{urlencode(q)}',
+        headers=dict(Authorization=f"Bearer {token}"),
+    ).json
+    with client.get(
+        f'/schema/{Student.database}/table/{"Student"}/record',
+        headers=dict(
+            Authorization=f"Bearer {token}",
+            Accept="application/vnd.apache.arrow.stream",
+        ),
+    ) as REST_response:
+        assert REST_response.mimetype == "application/vnd.apache.arrow.stream"
+        arrow_table = pa.ipc.open_stream(REST_response.data).read_all()
+    assert arrow_table.column_names == REST_page["recordHeader"]
+    assert arrow_table.schema.field("student_enroll_date").type == pa.timestamp("us")
+    assert arrow_table.column("student_id").to_pylist() == [
+        r[0] for r in REST_page["records"]
+    ]
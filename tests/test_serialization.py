@@ -0,0 +1,88 @@
+import datetime
+import json
+from base64 import b64decode
+from uuid import UUID
+import numpy as np
+from flask import Flask
+from pharus.component_interface import NumpyEncoder
+from pharus.serialization import dumps, JSONProvider
+
+
+def test_dumps():
+    assert json.loads(
+        dumps(
+            dict(
+                scalar=np.float64(1.5),
+                array=np.arange(4).reshape(2, 2).T,
+                strings=np.array(["a", "b"]),
+                nan=float("nan"),
+                uuid=UUID(int=1),
+                datetime=datetime.datetime(2021, 1, 1, 13),
+            )
+        )
+    ) == dict(
+        scalar=1.5,
+        array=[[0, 2], [1, 3]],
+        strings=["a", "b"],
+        nan=None,
+        uuid="00000000-0000-0000-0000-000000000001",
+        datetime="2021-01-01T13:00:00",
+    )
+
+    # Falls back to the standard library for integers beyond 64 bits
+    assert dumps([2**70]) == f"[{2**70}]"
+    # which serializes non-finite floats as null as well
+    assert (
+        dumps(dict(a=float("nan"), big=2**70, c=np.array([1.0, np.inf])))
+        == f'{{"a":null,"big":{2**70},"c":[1.0,null]}}'
+    )
+
+
+def test_dumps_stdlib(monkeypatch):
+    monkeypatch.setenv("PHARUS_JSON_SERIALIZER", "json")
+    assert dumps(dict(b=np.int32(1), a=np.array([1.5]))) == '{"b":1,"a":[1.5]}'
+    assert (
+        dumps(dict(a=float("nan"), b=np.float64("-inf"), c=[1.0, float("inf")]))
+        == '{"a":null,"b":null,"c":[1.0,null]}'
+    )
+    assert dumps(dict(a=np.array([np.nan]), b=(float("nan"),))) == (
+        '{"a":[null],"b":[null]}'
+    )
+
+
+def test_json_provider():
+    app = Flask(__name__)
+    app.json = JSONProvider(app)
+    with app.app_context():
+        assert (
+            app.json.response(
+                dict(b=np.int64(1), a=datetime.datetime(2021, 1, 1))
+            ).get_data()
+            == b'{"a":"Fri, 01 Jan 2021 00:00:00 GMT","b":1}\n'
+        )
+
+
+def test_typed_arrays():
+    typed = json.loads(
+        dumps(
+            dict(
+                matrix=np.arange(6, dtype=np.float64).reshape(2, 3),
+                ints=np.arange(3),
+                big=np.array([2**40]),
+                strings=np.array(["a"]),
+            ),
+            typed_arrays=True,
+        )
+    )
+    assert typed["matrix"]["dtype"] == "f8" and typed["matrix"]["shape"] == "2, 3"
+    assert np.array_equal(
+        np.frombuffer(b64decode(typed["matrix"]["bdata"]), "<f8").reshape(2, 3),
+        np.arange(6).reshape(2, 3),
+    )
+    # 64-bit integers are narrowed when they fit
+    assert typed["ints"] == dict(dtype="i4", bdata="AAAAAAEAAAACAAAA")
+    assert typed["big"] == [2**40]
+    assert typed["strings"] == ["a"]
+    assert json.loads(
+        NumpyEncoder.dumps(dict(ints=np.arange(3)), typed_arrays=True)
+    ) == dict(ints=dict(dtype="i4", bdata="AAAAAAEAAAACAAAA"))
@@ -1,3 +1,4 @@
+import datajoint as dj
 from . import (
     SCHEMA_PREFIX,
     client,
@@ -44,3 +45,24 @@ def test_definition_part_table(token, client, ParentPart):
     ).data
 
     assert f"{ProcessScanData.database}.ProcessScanData" in REST_value.decode("utf-8")
+
+
+def test_definition_after_schema_change(token, client, schemas_simple):
+    simple1, _ = schemas_simple
+    client.get(
+        f"/schema/{simple1.database}/table/TableB/definition",
+        headers=dict(Authorization=f"Bearer {token}"),
+    )
+
+    # Declaring a table must invalidate the virtual module cached by the prior request
+    @simple1
+    class TableNew(dj.Manual):
+        definition = """
+        new_id: int
+        """
+
+    REST_definition = client.get(
+        f"/schema/{simple1.database}/table/TableNew/definition",
+        headers=dict(Authorization=f"Bearer {token}"),
+    ).data
+    assert "new_id" in REST_definition.decode("utf-8")